@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.orm import Session, joinedload, raiseload, selectinload
+
+from models import Author, Book, Genre
+
+
+
+# Порядки выдачи каталога: имя -> колонки ключа (последняя — уникальный book_id)
+ORDERS = {
+    "id": (Book.book_id,),
+    "title": (Book.title, Book.book_id),
+}
+
+# Стратегии подгрузки автора и жанра для выборок ORM-объектов
+LOADERS = {
+    "joined": joinedload,    # тем же SELECT-ом через JOIN
+    "selectin": selectinload,  # вторым SELECT ... WHERE id IN (...) на страницу
+}
+
+PAGE_SIZE = 50
+
+
+@dataclass
+class Page:
+    items: List[Any]
+    next_key: Optional[Tuple]  # передаётся в after для следующей страницы; None — страниц больше нет
+
+
+def _filtered(stmt: Select, author_id: Optional[int], genre_id: Optional[int]) -> Select:
+    if author_id is not None:
+        stmt = stmt.where(Book.author_id == author_id)
+    if genre_id is not None:
+        stmt = stmt.where(Book.genre_id == genre_id)
+    return stmt
+
+
+def _keyset(stmt: Select, order: str, after: Optional[Sequence], limit: int) -> Select:
+    """
+    Страница после ключа after: WHERE (title, book_id) > (...) ORDER BY title, book_id LIMIT n.
+    В отличие от OFFSET, цена страницы не растёт с её номером — индекс сразу ведёт к ключу.
+    """
+    keys = ORDERS[order]
+    if after is not None:
+        stmt = stmt.where(tuple_(*keys) > tuple_(*after) if len(keys) > 1 else keys[0] > after[0])
+    # на строку больше страницы — чтобы узнать, есть ли следующая, без лишнего запроса
+    return stmt.order_by(*keys).limit(limit + 1)
+
+
+def _page(items: List[Any], limit: int, key_of) -> Page:
+    if len(items) <= limit:
+        return Page(items, None)
+    items = items[:limit]
+    return Page(items, key_of(items[-1]))
+
+
+# ---------- Листинг: только нужные колонки, без ORM-объектов ----------
+
+def listing_query() -> Select:
+    """Строки для вывода каталога: книга с именами автора и жанра одним JOIN-ом."""
+    return (
+        select(
+            Book.book_id, Book.title,
+            Author.name_author, Genre.name_genre,
+            Book.price, Book.amount,
+        )
+        .join(Author, Author.author_id == Book.author_id)
+        .join(Genre, Genre.genre_id == Book.genre_id)
+    )
+
+
+def list_page(
+    session: Session,
+    after: Optional[Sequence] = None,
+    limit: int = PAGE_SIZE,
+    order: str = "title",
+    author_id: Optional[int] = None,
+    genre_id: Optional[int] = None,
+) -> Page:
+    """Одна страница листинга — один запрос."""
+    stmt = _keyset(_filtered(listing_query(), author_id, genre_id), order, after, limit)
+    rows = session.execute(stmt).all()
+    return _page(rows, limit, lambda r: tuple(getattr(r, c.key) for c in ORDERS[order]))
+
+
+def iter_listing(session: Session, page_size: int = PAGE_SIZE, order: str = "title", **filters) -> Iterator[Any]:
+    """Весь каталог постранично: в памяти не больше одной страницы."""
+    after = None
+    while True:
+        page = list_page(session, after, page_size, order, **filters)
+        yield from page.items
+        if page.next_key is None:
+            return
+        after = page.next_key
+
+
+# ---------- ORM-объекты с явной подгрузкой связей ----------
+
+def books_page(
+    session: Session,
+    after: Optional[Sequence] = None,
+    limit: int = PAGE_SIZE,
+    order: str = "title",
+    strategy: str = "joined",
+    author_id: Optional[int] = None,
+    genre_id: Optional[int] = None,
+) -> Page:
+    """
+    Страница объектов Book с уже загруженными author и genre: один запрос (joined)
+    или два (selectin) на страницу. Прочие связи не подгружаются неявно — обращение
+    к ним бросает исключение вместо скрытого SELECT на каждую книгу.
+    """
+    load = LOADERS[strategy]
+    stmt = select(Book).options(load(Book.author), load(Book.genre), raiseload("*"))
+    stmt = _keyset(_filtered(stmt, author_id, genre_id), order, after, limit)
+    books = list(session.scalars(stmt))
+    return _page(books, limit, lambda b: tuple(getattr(b, c.key) for c in ORDERS[order]))
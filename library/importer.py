@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from sqlalchemy import any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import Session
+
+from models import Author, Book, Genre
+from database import engine
+from main import init_db
+
+
+
+BATCH_SIZE = 5000
+
+# Справочник -> колонка с названием
+NAME_COLUMNS = {
+    Author: Author.name_author,
+    Genre: Genre.name_genre,
+}
+
+# Поле файла -> наибольшая длина по колонке в БД: лишнее отсекается при разборе строки,
+# а не ошибкой всего пакета при INSERT
+TEXT_LIMITS = {
+    "title": Book.title.type.length,
+    "author": Author.name_author.type.length,
+    "genre": Genre.name_genre.type.length,
+}
+
+# Numeric(10, 2): не больше 8 знаков до запятой, копейки
+PRICE_QUANTUM = Decimal(1).scaleb(-Book.price.type.scale)
+PRICE_LIMIT = Decimal(10) ** (Book.price.type.precision - Book.price.type.scale)
+
+# Integer в PostgreSQL
+AMOUNT_LIMIT = 2 ** 31 - 1
+
+
+# ---------- Чтение файла ----------
+
+def iter_records(path: str) -> Iterator[Tuple[int, Any]]:
+    """
+    (номер строки, сырая запись) из CSV с заголовком или JSONL (по расширению .jsonl/.ndjson):
+    для JSONL — строка как есть, разбирается в decode_record, чтобы ошибка одной строки
+    не обрывала весь импорт.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, line
+        else:
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+
+
+def _reject_constant(name: str) -> None:
+    raise ValueError(f"недопустимое число {name}")
+
+
+def decode_record(raw: Any) -> Dict[str, Any]:
+    """Запись-словарь из сырой записи iter_records; дробные числа JSON — сразу Decimal."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw, parse_float=Decimal, parse_constant=_reject_constant)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"некорректный JSON: {e.msg} (символ {e.pos + 1})") from None
+    if not isinstance(raw, dict):
+        raise ValueError(f"ожидался объект с полями, а не {type(raw).__name__}")
+    return raw
+
+
+def _text(record: Dict[str, Any], key: str) -> str:
+    value = record.get(key)
+    if isinstance(value, (list, dict, bool)):
+        raise ValueError(f"{key}: ожидалась строка, а не {type(value).__name__}")
+    value = str(value if value is not None else "").strip()
+    if len(value) > TEXT_LIMITS[key]:
+        raise ValueError(f"{key} длиннее {TEXT_LIMITS[key]} символов")
+    return value
+
+
+def parse_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Поля книги из записи файла: title, author, genre, price, amount (по умолчанию 0)."""
+    title, author, genre = (_text(record, key) for key in ("title", "author", "genre"))
+    if not (title and author and genre):
+        raise ValueError("нужны title, author и genre")
+
+    raw_price = record.get("price")
+    try:
+        if isinstance(raw_price, (bool, list, dict)) or raw_price is None:
+            raise InvalidOperation
+        price = Decimal(str(raw_price).strip())
+        if not price.is_finite():
+            raise InvalidOperation
+        price = price.quantize(PRICE_QUANTUM)
+    except InvalidOperation:
+        raise ValueError(f"некорректная цена: {raw_price!r}") from None
+    if not 0 <= price < PRICE_LIMIT:
+        raise ValueError(f"цена вне диапазона [0, {PRICE_LIMIT}): {raw_price!r}")
+
+    raw_amount = record.get("amount")
+    try:
+        if isinstance(raw_amount, (bool, list, dict)):
+            raise ValueError
+        amount = int(raw_amount or 0)
+        if isinstance(raw_amount, (float, Decimal)) and amount != raw_amount:
+            raise ValueError  # дробный остаток
+    except (ValueError, OverflowError):
+        raise ValueError(f"некорректный остаток: {raw_amount!r}") from None
+    if not 0 <= amount <= AMOUNT_LIMIT:
+        raise ValueError(f"остаток вне диапазона [0, {AMOUNT_LIMIT}]: {raw_amount!r}")
+    return {"title": title, "author": author, "genre": genre, "price": price, "amount": amount}
+
+
+# ---------- Справочники ----------
+
+def get_or_create_ids(session: Session, model, names: Iterable[str]) -> Dict[str, int]:
+    """
+    name -> id для набора имён: недостающие вставляются одним INSERT ... ON CONFLICT DO NOTHING
+    по уникальному имени, затем все id читаются одним SELECT ... = ANY.
+    """
+    names = sorted(set(names))
+    if not names:
+        return {}
+    column = NAME_COLUMNS[model]
+    session.execute(
+        insert(model).values([{column.key: n} for n in names]).on_conflict_do_nothing(index_elements=[column.key])
+    )
+    pk = model.__mapper__.primary_key[0]
+    # один параметр-массив вместо IN (...) на тысячи плейсхолдеров
+    wanted = bindparam("names", names, type_=ARRAY(column.type))
+    return dict(session.execute(select(column, pk).where(column == any_(wanted))).all())
+
+
+class NameCache:
+    """Кэш name -> id авторов и жанров на время импорта: за пакет — только новые имена."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[type, Dict[str, int]] = {model: {} for model in NAME_COLUMNS}
+
+    def resolve(self, session: Session, model, names: Iterable[str]) -> Dict[str, int]:
+        ids = self._ids[model]
+        missing = {n for n in names if n not in ids}
+        if missing:
+            ids.update(get_or_create_ids(session, model, missing))
+        return ids
+
+
+# ---------- Книги ----------
+
+def insert_books(session: Session, books: List[Dict[str, Any]], names: NameCache, update: bool = False) -> int:
+    """
+    Пакет книг многострочными INSERT ... VALUES (...), (...) (insertmanyvalues) с ON CONFLICT
+    по uq_book_title_author: существующие пропускаются или (update) получают новые жанр, цену и остаток.
+    Возвращает число вставленных/обновлённых строк; коммит — на вызывающей стороне.
+    """
+    authors = names.resolve(session, Author, (b["author"] for b in books))
+    genres = names.resolve(session, Genre, (b["genre"] for b in books))
+    # повтор (title, author) внутри одного INSERT ... ON CONFLICT DO UPDATE недопустим — берём последний
+    rows = {}
+    for b in books:
+        author_id = authors[b["author"]]
+        rows[(b["title"], author_id)] = {
+            "title": b["title"], "author_id": author_id, "genre_id": genres[b["genre"]],
+            "price": b["price"], "amount": b["amount"],
+        }
+    stmt = insert(Book)
+    if update:
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_book_title_author",
+            set_={
+                "genre_id": stmt.excluded.genre_id,
+                "price": stmt.excluded.price,
+                "amount": stmt.excluded.amount,
+            },
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(constraint="uq_book_title_author")
+    result = session.execute(stmt.returning(Book.book_id), list(rows.values()))
+    return len(result.all())
+
+
+def import_books(path: str, batch_size: int = BATCH_SIZE, update: bool = False) -> None:
+    names = NameCache()
+    read = written = skipped = 0
+    batch: List[Dict[str, Any]] = []
+
+    with Session(engine) as session:
+        def flush() -> None:
+            nonlocal written
+            if batch:
+                written += insert_books(session, batch, names, update)
+                session.commit()
+                batch.clear()
+
+        for line_no, raw in iter_records(path):
+            read += 1
+            try:
+                batch.append(parse_record(decode_record(raw)))
+            except (ValueError, TypeError) as e:
+                skipped += 1
+                print(f"Строка {line_no}: {e} — пропускаю")
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+    action = "добавлено/обновлено" if update else "добавлено"
+    print(f"Прочитано записей: {read}, {action} книг: {written}, пропущено с ошибками: {skipped}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Массовый импорт книг из CSV/JSONL")
+    parser.add_argument("path", help="Файл с полями title, author, genre, price, amount (CSV с заголовком или JSONL)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Книг в одной транзакции (по умолчанию {BATCH_SIZE})")
+    parser.add_argument("--update", action="store_true", help="Обновлять жанр, цену и остаток уже существующих книг")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        raise SystemExit("batch-size должно быть >= 1")
+
+    init_db()
+    import_books(args.path, args.batch_size, args.update)
+
+
+if __name__ == "__main__":
+    main()
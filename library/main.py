@@ -4,6 +4,7 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 
+import catalog
 import models
 from models import Base, Author, Genre, Book
 from database import engine
@@ -12,6 +13,9 @@ from database import engine
 
 def init_db() -> None:
     Base.metadata.create_all(bind=engine)
+    # индексы, добавленные в модели после создания таблиц, create_all сам не досоздаёт
+    for index in Book.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 
 def seed_if_empty() -> None:
@@ -46,13 +50,13 @@ def seed_if_empty() -> None:
         print("База инициализирована: добавлены 5 книг.")
 
 
-def list_books() -> None:
+def list_books(page_size: int = catalog.PAGE_SIZE) -> None:
+    # только нужные колонки, постранично по ключу — запрос на страницу, а не на книгу
     with Session(engine) as session:
-        rows = session.query(Book).join(Book.author).join(Book.genre).all()
-        for b in rows:
+        for b in catalog.iter_listing(session, page_size=page_size, order="title"):
             print(
                 f"{b.book_id:>3} | {b.title:32} | "
-                f"{b.author.name_author:20} | {b.genre.name_genre:18} | "
+                f"{b.name_author:20} | {b.name_genre:18} | "
                 f"{b.price} ₽ | qty={b.amount}"
             )
 
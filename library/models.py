@@ -5,7 +5,7 @@ from decimal import Decimal
 from typing import Optional, List, Union
 
 from sqlalchemy import (
-    ForeignKey, String, Integer, Numeric, Date, Text, UniqueConstraint
+    ForeignKey, String, Integer, Numeric, Date, Text, UniqueConstraint, Index
 )
 from sqlalchemy.orm import (
     DeclarativeBase, Mapped, mapped_column, relationship
@@ -94,6 +94,8 @@ class Book(Base):
     __tablename__ = "book"
     __table_args__ = (
         UniqueConstraint("title", "author_id", name="uq_book_title_author"),
+        # ключ постраничной выдачи каталога по названию (catalog.ORDERS["title"])
+        Index("ix_book_title_book_id", "title", "book_id"),
     )
 
     book_id: Mapped[int] = mapped_column(primary_key=True)
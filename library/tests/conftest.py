@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+# модули импортируются плоско (from models import ...), как при запуске из library/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DATABASE_URL  # noqa: E402
+from models import Base  # noqa: E402
+
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    """
+    Движок к БД из .env, но с search_path на временную схему: тесты пишут только туда,
+    схема удаляется в конце. Без доступной БД тесты, которым она нужна, пропускаются.
+    """
+    schema = f"library_test_{os.getpid()}"
+    engine = create_engine(DATABASE_URL, connect_args={"options": f"-c search_path={schema}"})
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+            Base.metadata.create_all(bind=conn)
+    except OperationalError as e:
+        engine.dispose()
+        pytest.skip(f"нет доступа к PostgreSQL: {e.orig}")
+    yield engine
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    engine.dispose()
+
+
+@pytest.fixture
+def db(db_engine):
+    """Пустые таблицы перед каждым тестом."""
+    tables = ", ".join(t.name for t in reversed(Base.metadata.sorted_tables))
+    with db_engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    return db_engine
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+
+from catalog import ORDERS, books_page, iter_listing, list_page, listing_query
+from models import Author, Book, Genre
+
+
+
+@pytest.fixture
+def books(db):
+    """
+    23 книги: каждое название — у трёх авторов (порядок по title решает book_id),
+    а названия идут против порядка вставки, чтобы порядки id и title различались.
+    """
+    with Session(db) as session:
+        authors = [Author(name_author=f"Автор {i}") for i in range(3)]
+        genres = [Genre(name_genre=f"Жанр {i}") for i in range(2)]
+        session.add_all(authors + genres)
+        session.flush()
+        for i in range(23):
+            session.add(Book(
+                f"Название {7 - i // 3}", authors[i % 3], genres[i % 2], Decimal(100 + i), i,
+            ))
+        session.commit()
+    return db
+
+def offset_listing(session, order, page_size, **filters):
+    """Эталон: тот же листинг через ORDER BY ... OFFSET, страница за страницей."""
+    stmt = listing_query().order_by(*ORDERS[order])
+    if filters.get("author_id") is not None:
+        stmt = stmt.where(Book.author_id == filters["author_id"])
+    if filters.get("genre_id") is not None:
+        stmt = stmt.where(Book.genre_id == filters["genre_id"])
+    rows, offset = [], 0
+    while True:
+        page = session.execute(stmt.offset(offset).limit(page_size)).all()
+        rows += page
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+@pytest.mark.parametrize("order", sorted(ORDERS))
+@pytest.mark.parametrize("page_size", [1, 3, 5, 23, 50])
+@pytest.mark.parametrize("filters", [{}, {"author_id": 2}, {"genre_id": 1}, {"author_id": 1, "genre_id": 2}])
+def test_keyset_walk_matches_offset_listing(books, order, page_size, filters):
+    with Session(books) as session:
+        got = list(iter_listing(session, page_size=page_size, order=order, **filters))
+        expected = offset_listing(session, order, page_size, **filters)
+
+    assert got == expected
+    assert len({r.book_id for r in got}) == len(got)  # без повторов на стыках страниц
+
+def test_pages_chain_and_end_without_extra_page(books):
+    with Session(books) as session:
+        after, pages = None, []
+        while True:
+            page = list_page(session, after, limit=4)
+            pages.append(page)
+            if page.next_key is None:
+                break
+            # ключ — (title, book_id) последней строки страницы
+            assert page.next_key == (page.items[-1].title, page.items[-1].book_id)
+            after = page.next_key
+
+        assert [len(p.items) for p in pages] == [4, 4, 4, 4, 4, 3]
+
+        # ровно на границе: последняя полная страница сразу говорит, что дальше пусто
+        first = list_page(session, limit=23)
+        assert len(first.items) == 23 and first.next_key is None
+        assert list_page(session, ("Название 7", 10 ** 9), limit=5).items == []
+
+def test_filtered_cursor_stays_within_filter(books):
+    with Session(books) as session:
+        page = list_page(session, limit=2, author_id=1)
+        rest = list_page(session, page.next_key, limit=50, author_id=1)
+
+    names = {r.name_author for r in page.items + rest.items}
+    assert names == {"Автор 0"}  # author_id = 1 — первый вставленный
+    assert len(page.items) + len(rest.items) == 8  # i % 3 == 0 среди 0..22
+
+@pytest.mark.parametrize("strategy", ["joined", "selectin"])
+def test_books_page_walk_and_explicit_loading(books, strategy):
+    with Session(books) as session:
+        got, after = [], None
+        while True:
+            page = books_page(session, after, limit=5, strategy=strategy)
+            got += page.items
+            if page.next_key is None:
+                break
+            after = page.next_key
+
+        expected = [r.book_id for r in offset_listing(session, "title", 5)]
+        assert [b.book_id for b in got] == expected
+        assert all(b.author.name_author and b.genre.name_genre for b in got)
+        with pytest.raises(InvalidRequestError):
+            got[0].buy_books  # прочие связи не подгружаются неявно
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import importer
+from importer import NameCache, decode_record, import_books, insert_books, parse_record
+from models import Author, Book, Genre
+
+
+
+def book(**fields):
+    record = {"title": "Солярис", "author": "Станислав Лем", "genre": "Фантастика", "price": "650", "amount": "10"}
+    record.update(fields)
+    return record
+
+# ---------- разбор строки ----------
+
+@pytest.mark.parametrize("line, message", [
+    ('{"title": "Битая строка",', "некорректный JSON"),
+    ("[1, 2, 3]", "а не list"),
+    ('"просто строка"', "а не str"),
+    ("42", "а не int"),
+    ('{"title": "Т", "author": "А", "genre": "Ж", "price": NaN}', "NaN"),
+    ('{"title": "Т", "author": "А", "genre": "Ж", "price": Infinity}', "Infinity"),
+    ('{"title": "Т", "author": "А", "genre": "Ж", "price": -Infinity}', "-Infinity"),
+])
+def test_bad_json_lines_are_rejected(line, message):
+    with pytest.raises(ValueError, match=message):
+        parse_record(decode_record(line))
+
+@pytest.mark.parametrize("fields, message", [
+    ({"price": None}, "некорректная цена"),
+    ({"price": "abc"}, "некорректная цена"),
+    ({"price": "NaN"}, "некорректная цена"),        # из CSV приходит строкой
+    ({"price": "Infinity"}, "некорректная цена"),
+    ({"price": True}, "некорректная цена"),
+    ({"price": [650]}, "некорректная цена"),
+    ({"price": Decimal("1e40")}, "некорректная цена"),  # не квантуется до копеек
+    ({"price": "100000000"}, "цена вне диапазона"),     # Numeric(10, 2): < 10^8
+    ({"price": "99999999.999"}, "цена вне диапазона"),  # округляется до 10^8
+    ({"price": "-1"}, "цена вне диапазона"),
+    ({"amount": "x"}, "некорректный остаток"),
+    ({"amount": Decimal("2.5")}, "некорректный остаток"),
+    ({"amount": 2.5}, "некорректный остаток"),
+    ({"amount": [1]}, "некорректный остаток"),
+    ({"amount": True}, "некорректный остаток"),
+    ({"amount": float("inf")}, "некорректный остаток"),
+    ({"amount": Decimal("1e12")}, "остаток вне диапазона"),
+    ({"amount": 2 ** 31}, "остаток вне диапазона"),
+    ({"amount": -1}, "остаток вне диапазона"),
+    ({"title": "т" * 256}, "title длиннее 255"),
+    ({"author": "а" * 151}, "author длиннее 150"),
+    ({"genre": "ж" * 101}, "genre длиннее 100"),
+    ({"author": ["Станислав Лем"]}, "author: ожидалась строка"),
+    ({"title": "  "}, "нужны title, author и genre"),
+    ({"genre": None}, "нужны title, author и genre"),
+])
+def test_bad_fields_are_rejected(fields, message):
+    with pytest.raises(ValueError, match=message):
+        parse_record(book(**fields))
+
+def test_valid_record_is_normalized():
+    record = decode_record(json.dumps(book(
+        title=" " + "т" * 255 + " ", price=99999999.99, amount=3.0, genre="Фантастика",
+    )))
+    parsed = parse_record(record)
+
+    assert parsed["title"] == "т" * 255
+    assert parsed["price"] == Decimal("99999999.99")  # JSON-дробь читается Decimal-ом, без float
+    assert parsed["amount"] == 3
+    assert parse_record(book(price="0.1", amount=""))["price"] == Decimal("0.10")
+    assert parse_record(book(amount=None))["amount"] == 0
+
+# ---------- импорт в БД ----------
+
+def stored(engine):
+    with Session(engine) as session:
+        return {
+            (title, author): (genre, price, amount)
+            for title, author, genre, price, amount in session.execute(
+                select(Book.title, Author.name_author, Genre.name_genre, Book.price, Book.amount)
+                .join(Author, Author.author_id == Book.author_id)
+                .join(Genre, Genre.genre_id == Book.genre_id)
+            )
+        }
+
+def test_bad_lines_are_skipped_without_stopping_import(db, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(importer, "engine", db)
+    path = tmp_path / "books.jsonl"
+    path.write_text("\n".join([
+        json.dumps(book(title="Первая")),
+        '{"title": "Битая строка",',
+        "[1, 2]",
+        json.dumps(book(title="Дорогая", price=10 ** 8)),
+        '{"title": "Т", "author": "А", "genre": "Ж", "price": NaN}',
+        json.dumps(book(title="Вторая", amount=None)),
+    ]) + "\n", encoding="utf-8")
+
+    import_books(str(path), batch_size=1)
+
+    assert set(stored(db)) == {("Первая", "Станислав Лем"), ("Вторая", "Станислав Лем")}
+    out = capsys.readouterr().out
+    for line_no in (2, 3, 4, 5):
+        assert f"Строка {line_no}:" in out
+    assert "Прочитано записей: 6, добавлено книг: 2, пропущено с ошибками: 4" in out
+
+def test_csv_rows_are_validated_too(db, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(importer, "engine", db)
+    path = tmp_path / "books.csv"
+    path.write_text(
+        "title,author,genre,price,amount\n"
+        "Солярис,Станислав Лем,Фантастика,650,10\n"
+        "Эдем,Станислав Лем,Фантастика,NaN,1\n"
+        "Непобедимый,Станислав Лем,Фантастика,480,много\n",
+        encoding="utf-8",
+    )
+
+    import_books(str(path))
+
+    assert set(stored(db)) == {("Солярис", "Станислав Лем")}
+    out = capsys.readouterr().out
+    assert "Строка 3: некорректная цена" in out and "Строка 4: некорректный остаток" in out
+
+@pytest.mark.parametrize("update", [False, True])
+def test_existing_books_are_skipped_or_updated(db, update):
+    names = NameCache()
+    with Session(db) as session:
+        insert_books(session, [parse_record(book())], names)
+        session.commit()
+
+        written = insert_books(session, [
+            parse_record(book(genre="Классика", price="700", amount="3")),
+            parse_record(book(title="Эдем", price="480")),
+        ], names, update=update)
+        session.commit()
+
+    assert written == (2 if update else 1)
+    data = stored(db)
+    assert data[("Эдем", "Станислав Лем")] == ("Фантастика", Decimal("480.00"), 10)
+    if update:
+        assert data[("Солярис", "Станислав Лем")] == ("Классика", Decimal("700.00"), 3)
+    else:
+        assert data[("Солярис", "Станислав Лем")] == ("Фантастика", Decimal("650.00"), 10)
+
+def test_repeated_book_in_one_batch_keeps_last(db):
+    with Session(db) as session:
+        insert_books(session, [parse_record(book(price="1")), parse_record(book(price="2"))], NameCache(), update=True)
+        session.commit()
+
+    assert stored(db)[("Солярис", "Станислав Лем")][1] == Decimal("2.00")
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Date, cast, delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from database import LOCK_NAMESPACE
+from models import SpimexDailyDynamics, SpimexMonthlyDynamics, SpimexTradingResult
+
+
+
+_DIMS = ("oil_id", "delivery_basis_id", "delivery_type_id")
+
+# ---------- ОБНОВЛЕНИЕ ----------
+
+def refresh_days(session: Session, days: Iterable[dt.date]) -> None:
+    """
+    Пересчитывает дневные агрегаты за указанные даты и месячные — за их месяцы.
+    Выполняется в транзакции вызывающего (обычно вместе с UPSERT-ом дня).
+    Месяцы блокируются до конца транзакции: параллельные загрузчики, пишущие
+    разные дни одного месяца, пересчитывают его по очереди.
+    """
+    days = sorted(set(days))
+    if not days:
+        return
+    T, D, M = SpimexTradingResult, SpimexDailyDynamics, SpimexMonthlyDynamics
+
+    months = sorted({d.replace(day=1) for d in days})
+    for month in months:  # по порядку — без взаимных блокировок
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(:ns, :key)"), {"ns": LOCK_NAMESPACE, "key": -month.toordinal()}
+        )
+
+    session.execute(delete(D).where(D.date.in_(days)))
+    session.execute(insert(D).from_select(
+        ["date", *_DIMS, "volume", "total", "count", "results"],
+        select(
+            T.date, T.oil_id, T.delivery_basis_id, T.delivery_type_id,
+            func.sum(T.volume), func.sum(T.total), func.sum(T.count), func.count(),
+        )
+        .where(T.date.in_(days))
+        .group_by(T.date, T.oil_id, T.delivery_basis_id, T.delivery_type_id),
+    ))
+
+    month_of = cast(func.date_trunc("month", D.date), Date)
+    session.execute(delete(M).where(M.month.in_(months)))
+    session.execute(insert(M).from_select(
+        ["month", *_DIMS, "volume", "total", "count", "results", "trading_days"],
+        select(
+            month_of, D.oil_id, D.delivery_basis_id, D.delivery_type_id,
+            func.sum(D.volume), func.sum(D.total), func.sum(D.count), func.sum(D.results), func.count(),
+        )
+        .where(month_of.in_(months))
+        .group_by(month_of, D.oil_id, D.delivery_basis_id, D.delivery_type_id),
+    ))
+
+def rebuild_all(session: Session, chunk_days: int = 31) -> int:
+    """Полный пересчёт агрегатов по всем датам базовой таблицы (порциями). Возвращает число дат."""
+    T = SpimexTradingResult
+    days: List[dt.date] = list(session.execute(select(T.date).distinct().order_by(T.date)).scalars())
+    for i in range(0, len(days), chunk_days):
+        refresh_days(session, days[i : i + chunk_days])
+        session.commit()
+    return len(days)
+
+# ---------- ЧТЕНИЕ ----------
+
+def _filtered(stmt, model, oil_id, delivery_basis_id, delivery_type_id):
+    if oil_id is not None:
+        stmt = stmt.where(model.oil_id == oil_id)
+    if delivery_basis_id is not None:
+        stmt = stmt.where(model.delivery_basis_id == delivery_basis_id)
+    if delivery_type_id is not None:
+        stmt = stmt.where(model.delivery_type_id == delivery_type_id)
+    return stmt
+
+def get_daily_dynamics(
+    session: Session,
+    start: dt.date,
+    end: dt.date,
+    oil_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Дневные объёмы/суммы/число договоров за [start, end] по измерениям."""
+    D = SpimexDailyDynamics
+    stmt = select(*D.__table__.columns).where(D.date >= start, D.date <= end)
+    stmt = _filtered(stmt, D, oil_id, delivery_basis_id, delivery_type_id)
+    stmt = stmt.order_by(D.date, D.oil_id, D.delivery_basis_id, D.delivery_type_id)
+    return [dict(r._mapping) for r in session.execute(stmt)]
+
+def get_monthly_dynamics(
+    session: Session,
+    start: dt.date,
+    end: dt.date,
+    oil_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Месячные агрегаты для месяцев, пересекающих [start, end]."""
+    M = SpimexMonthlyDynamics
+    stmt = select(*M.__table__.columns).where(M.month >= start.replace(day=1), M.month <= end)
+    stmt = _filtered(stmt, M, oil_id, delivery_basis_id, delivery_type_id)
+    stmt = stmt.order_by(M.month, M.oil_id, M.delivery_basis_id, M.delivery_type_id)
+    return [dict(r._mapping) for r in session.execute(stmt)]
+
+def main():
+    from database import SessionLocal
+    from loader import init_db
+
+    parser = argparse.ArgumentParser(description="Агрегаты динамики торгов SPIMEX")
+    parser.add_argument("--rebuild", action="store_true", help="Пересчитать агрегаты по всей таблице результатов")
+    args = parser.parse_args()
+
+    init_db()
+    if args.rebuild:
+        with SessionLocal() as session:
+            print(f"Пересчитано дат: {rebuild_all(session)}")
+
+if __name__ == "__main__":
+    main()
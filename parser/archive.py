@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import datetime as dt
+import glob
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+
+
+# Колонки разобранного дня (выход parse_bulletin_xls)
+ARCHIVE_COLUMNS = [
+    "exchange_product_id",
+    "exchange_product_name",
+    "delivery_basis_name",
+    "volume",
+    "total",
+    "count",
+    "date",
+]
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Для архива Parquet нужен пакет pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+def day_path(root: str, day: dt.date) -> str:
+    """root/year=YYYY/month=MM/date=YYYY-MM-DD.parquet — раскладка в стиле Hive."""
+    return os.path.join(root, f"year={day:%Y}", f"month={day:%m}", f"date={day:%Y-%m-%d}.parquet")
+
+def write_day(root: str, day: dt.date, df: pd.DataFrame) -> str:
+    """Сохраняет разобранный DataFrame дня (перезаписывая прежний файл)."""
+    pa, pq = _pyarrow()
+    path = day_path(root, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df[ARCHIVE_COLUMNS], preserve_index=False)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+    return path
+
+def read_day(path: str) -> pd.DataFrame:
+    """Читает файл дня через memory map; пропуски в текстовых колонках — NaN, как после разбора."""
+    _, pq = _pyarrow()
+    df = pq.read_table(path, memory_map=True).to_pandas()
+    for col in ("exchange_product_id", "exchange_product_name", "delivery_basis_name"):
+        df[col] = df[col].astype(object).where(df[col].notna(), np.nan)
+    return df
+
+def iter_archive(root: str, since: Optional[dt.date] = None, until: Optional[dt.date] = None) -> Iterator[tuple[dt.date, str, pd.DataFrame]]:
+    """(дата, путь, DataFrame) для дней архива в [since, until), по порядку дат."""
+    found = []
+    for path in glob.glob(os.path.join(root, "year=*", "month=*", "date=*.parquet")):
+        name = os.path.basename(path)[len("date="):-len(".parquet")]
+        try:
+            day = dt.date.fromisoformat(name)
+        except ValueError:
+            continue
+        if (since is None or day >= since) and (until is None or day < until):
+            found.append((day, path))
+    for day, path in sorted(found):
+        yield day, path, read_day(path)
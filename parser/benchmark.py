@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from bulletin_gen import UNITS, make_bulletin
+from parser import READERS, to_records, to_rows
+
+
+
+# Дата синтетических бюллетеней: заведомо вне реальных данных
+BENCH_DAY = dt.date(1999, 1, 4)
+
+def measure(fn: Callable[[], Any], repeat: int = 3) -> Tuple[Any, float, float]:
+    """
+    (результат, лучшее время в секундах, пик памяти Python-аллокаций в МБ).
+    Время меряется без tracemalloc (он сильно замедляет код), память — отдельным прогоном.
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak / 2**20
+
+def _stage(rows: int, seconds: float, peak_mb: float) -> Dict[str, float]:
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 6),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "peak_mb": round(peak_mb, 2),
+    }
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+@contextmanager
+def scratch_engine() -> Iterator[Any]:
+    """
+    Движок, у которого search_path — отдельная временная схема с таблицами загрузчика.
+    Справочники названий пополняются своими транзакциями с коммитом
+    (dimensions.get_or_create_ids), откат сессии их не убирает — поэтому после
+    замеров схема удаляется целиком и в рабочих таблицах ничего не остаётся.
+    """
+    from sqlalchemy import create_engine, text
+
+    import models  # noqa: F401 — таблицы в Base.metadata
+    from database import DATABASE_URL, Base
+    from partitions import ensure_partitions
+
+    schema = f"spimex_bench_{os.getpid()}"
+    bench = create_engine(DATABASE_URL, connect_args={"options": f"-c search_path={schema}"})
+    try:
+        with bench.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+            Base.metadata.create_all(bind=conn)
+            ensure_partitions(conn, BENCH_DAY, BENCH_DAY + dt.timedelta(days=1))
+        yield bench
+    finally:
+        with bench.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        bench.dispose()
+
+def run(config: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    content = make_bulletin(
+        BENCH_DAY, rows_per_section=config["rows"], sheets=config["sheets"],
+        units=UNITS[: config["sections"]], seed=config["seed"],
+    )
+    stages: Dict[str, Dict[str, float]] = {}
+
+    df = None
+    for name in config["readers"]:
+        df, sec, peak = measure(lambda: READERS[name](content, fallback_date=BENCH_DAY), config["repeat"])
+        stages[f"parse[{name}]"] = _stage(len(df), sec, peak)
+
+    records, sec, peak = measure(lambda: to_records(df), config["repeat"])
+    stages["to_records"] = _stage(len(records), sec, peak)
+    rows, sec, peak = measure(lambda: to_rows(df), config["repeat"])
+    stages["to_rows"] = _stage(len(rows), sec, peak)
+
+    if config["db"]:
+        # Запись в локальный Postgres (настройки из .env) во временную схему;
+        # каждая попытка откатывается, чтобы все писали в пустую таблицу
+        from sqlalchemy.orm import Session
+
+        from loader import copy_upsert_results, upsert_results
+
+        with scratch_engine() as bench:
+            for method in ("insert", "copy"):
+                def write():
+                    with Session(bench) as session:
+                        if method == "copy":
+                            stats = copy_upsert_results(session, rows)
+                        else:
+                            stats = upsert_results(session, records)
+                        session.rollback()
+                        return stats
+                _, sec, peak = measure(write, config["repeat"])
+                stages[f"upsert[{method}]"] = _stage(len(records), sec, peak)
+    return stages
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def print_report(stages: Dict[str, Dict[str, float]], previous: Optional[Dict[str, Any]] = None) -> None:
+    print(f"{'стадия':<16} {'строк':>8} {'сек':>10} {'строк/сек':>12} {'пик МБ':>8}  {'Δ к прошлому':>12}")
+    for name, st in stages.items():
+        delta = ""
+        prev = (previous or {}).get("stages", {}).get(name)
+        if prev and prev.get("seconds"):
+            delta = f"{(st['seconds'] / prev['seconds'] - 1) * 100:+.1f}%"
+        print(
+            f"{name:<16} {st['rows']:>8} {st['seconds']:>10.4f} "
+            f"{st['rows_per_sec'] or 0:>12.0f} {st['peak_mb']:>8.1f}  {delta:>12}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора и записи бюллетеней SPIMEX на синтетических данных")
+    parser.add_argument("--rows", type=int, default=2000, help="Строк в каждой секции (по умолчанию 2000)")
+    parser.add_argument("--sheets", type=int, default=1, help="Листов в файле (по умолчанию 1)")
+    parser.add_argument("--sections", type=int, default=3, choices=range(1, len(UNITS) + 1), help="Секций «Единица измерения» на листе")
+    parser.add_argument("--readers", default=",".join(sorted(READERS)), help="Какие читатели мерить, через запятую")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждой стадии (берём лучшее время)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", action="store_true", help="Мерить и запись в локальный Postgres (во временной схеме, которая потом удаляется)")
+    parser.add_argument("--results", default="bench_results.jsonl", help="Куда дописывать результаты (JSON lines)")
+    parser.add_argument("--no-save", action="store_true", help="Не сохранять результат")
+    args = parser.parse_args()
+
+    readers = [r.strip() for r in args.readers.split(",") if r.strip()]
+    if not readers:
+        raise SystemExit("Нужен хотя бы один читатель в --readers")
+    unknown = [r for r in readers if r not in READERS]
+    if unknown:
+        raise SystemExit(f"Неизвестные читатели: {', '.join(unknown)}")
+
+    config = {
+        "rows": args.rows, "sheets": args.sheets, "sections": args.sections,
+        "readers": readers, "repeat": args.repeat, "seed": args.seed, "db": args.db,
+    }
+    stages = run(config)
+
+    previous = next((r for r in reversed(load_results(args.results)) if r.get("config") == config), None)
+    print_report(stages, previous)
+
+    if not args.no_save:
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "ts": dt.datetime.now().isoformat(timespec="seconds"),
+                "git": _git_rev(),
+                "config": config,
+                "stages": stages,
+            }, ensure_ascii=False) + "\n")
+
+if __name__ == "__main__":
+    main()
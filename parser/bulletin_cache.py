@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+
+
+class BulletinCache:
+    """
+    Локальный кэш скачанных бюллетеней.
+
+    objects/ab/<sha256> — содержимое файлов (адресация по хэшу содержимого);
+    index/<sha1(url)>.json — запись по URL: хэш, ETag/Last-Modified или отметка 404.
+    Отрицательные записи (404) живут negative_ttl секунд.
+    """
+
+    def __init__(self, root: str, negative_ttl: float = 7 * 24 * 3600, recent_days: int = 3) -> None:
+        self.root = root
+        self.negative_ttl = negative_ttl
+        # дни не старше recent_days перепроверяем условным запросом
+        self.recent_days = recent_days
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "index"), exist_ok=True)
+
+    # ---------- пути ----------
+
+    def _index_path(self, url: str) -> str:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, "index", f"{key}.json")
+
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # у каждого писателя свой временный файл: кэш пишут и потоки одного процесса
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+            f.write(data)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    # ---------- чтение ----------
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._index_path(url), "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def read(self, entry: Dict[str, Any]) -> Optional[bytes]:
+        try:
+            with open(self._object_path(entry["sha256"]), "rb") as f:
+                return f.read()
+        except (OSError, KeyError):
+            return None
+
+    def is_negative_fresh(self, entry: Dict[str, Any]) -> bool:
+        return entry.get("status") == 404 and time.time() - entry.get("checked_at", 0) < self.negative_ttl
+
+    # ---------- запись ----------
+
+    def _save_entry(self, url: str, entry: Dict[str, Any]) -> None:
+        entry["url"] = url
+        entry["checked_at"] = time.time()
+        self._write_atomic(self._index_path(url), json.dumps(entry).encode("utf-8"))
+
+    def store(self, url: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self._object_path(sha256)
+        if not os.path.exists(path):
+            self._write_atomic(path, content)
+        self._save_entry(url, {
+            "status": 200,
+            "sha256": sha256,
+            "size": len(content),
+            "etag": etag,
+            "last_modified": last_modified,
+        })
+
+    def store_missing(self, url: str) -> None:
+        self._save_entry(url, {"status": 404})
+
+    def touch(self, entry: Dict[str, Any]) -> None:
+        """Ответ 304: содержимое то же, обновляем только время проверки."""
+        self._save_entry(entry["url"], dict(entry))
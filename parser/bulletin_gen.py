@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import datetime as dt
+import io
+import random
+from typing import List, Sequence
+
+from parser import TON_MARKER
+
+
+
+# Варианты шапок (все распознаются через SYNONYMS в parser.py)
+HEADER_VARIANTS: List[dict] = [
+    {
+        "id": "Код\nИнструмента", "name": "Наименование\nИнструмента", "basis": "Базис\nпоставки",
+        "volume": "Объем\nДоговоров\nв единицах\nизмерения", "total": "Объем\nДоговоров,\nруб.",
+        "count": "Количество\nДоговоров,\nшт.",
+    },
+    {
+        "id": "Код Инструмента", "name": "Наименование Инструмента", "basis": "Базис поставки",
+        "volume": "Объем Договоров в единицах измерения", "total": "Объем Договоров руб.",
+        "count": "Количество Договоров шт.",
+    },
+]
+
+# Прочие колонки настоящего бюллетеня (в разбор не попадают, но занимают место)
+_EXTRA = [
+    "Изменение рыночной цены к цене предыдущего дня, руб.",
+    "Изменение рыночной цены к цене предыдущего дня, %",
+    "Цена (за единицу измерения), руб. Минимальная",
+    "Цена (за единицу измерения), руб. Средневзвешенная",
+    "Цена (за единицу измерения), руб. Максимальная",
+    "Цена в Заявках (за единицу измерения) Лучшее предложение",
+    "Цена в Заявках (за единицу измерения) Лучший спрос",
+    "Цена в Заявках (за единицу измерения) Рыночная",
+]
+
+UNITS = [TON_MARKER, "Единица измерения: Кубический метр", "Единица измерения: Килограмм"]
+
+def _money(r: random.Random, lo: int, hi: int) -> str:
+    # как в бюллетене: разряды через неразрывный пробел
+    return f"{r.randint(lo, hi):,}".replace(",", "\xa0")
+
+def make_bulletin(
+    day: dt.date,
+    rows_per_section: int = 500,
+    sheets: int = 1,
+    units: Sequence[str] = UNITS,
+    seed: int = 0,
+) -> bytes:
+    """
+    Синтетический .xls в раскладке бюллетеня SPIMEX: шапка с датой, несколько
+    секций «Единица измерения: …» на каждом листе, строки «Итого», часть
+    инструментов без сделок (count = "-"). Нужен пакет xlwt.
+    """
+    try:
+        import xlwt
+    except ImportError as e:
+        raise RuntimeError("Для генерации .xls нужен пакет xlwt (pip install xlwt)") from e
+
+    r = random.Random(seed)
+    wb = xlwt.Workbook(encoding="utf-8")
+    for sh in range(sheets):
+        ws = wb.add_sheet(f"TRADE_SUMMARY{'' if sh == 0 else sh}")
+        ws.write(2, 1, "Бюллетень по итогам торгов в Секции «Нефтепродукты» АО «Петербургская биржа»")
+        ws.write(3, 1, f"Дата торгов: {day:%d.%m.%Y}")
+        row = 6
+        for u, unit in enumerate(units):
+            ws.write(row, 2, unit)
+            row += 2
+            hdr = HEADER_VARIANTS[(sh + u) % len(HEADER_VARIANTS)]
+            cols = [hdr["id"], hdr["name"], hdr["basis"], hdr["volume"], hdr["total"], *_EXTRA, hdr["count"]]
+            for c, title in enumerate(cols, start=1):
+                ws.write(row, c, title)
+            row += 1
+            for i in range(rows_per_section):
+                oil = f"{'ABDS'[i % 4]}{r.randint(100, 999)}"
+                basis = r.choice(["ANK", "NVY", "UFM", "KRS", "ACH", "SPB"])
+                code = f"{oil}{basis}{sh}{u}{i:04d}{r.choice('FJ')}"
+                ws.write(row, 1, code)
+                ws.write(row, 2, f"Бензин (АИ-92-К5), ст. {basis} (партия {i})")
+                ws.write(row, 3, f"ст. {basis}")
+                deals = r.choice([0, 0, 1, 2, 3, 5, 8])
+                if deals:
+                    ws.write(row, 4, str(r.randint(60, 5000)))
+                    ws.write(row, 5, _money(r, 10**6, 10**9))
+                    for c in range(6, 6 + len(_EXTRA)):
+                        ws.write(row, c, r.randint(-500, 70000))
+                    ws.write(row, 6 + len(_EXTRA), deals)
+                else:
+                    for c in (4, 5, 6 + len(_EXTRA)):
+                        ws.write(row, c, "-")
+                row += 1
+            ws.write(row, 1, "Итого:")
+            ws.write(row, 6 + len(_EXTRA), rows_per_section)
+            row += 4  # пустая полоса перед следующей секцией
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
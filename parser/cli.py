@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import os
+from typing import List, Tuple
+
+from config import STATE_DIR
+from downloader import BASE
+from parser import READERS
+
+
+
+def loader_arguments(workers: int = 4) -> argparse.ArgumentParser:
+    """
+    Общие опции загрузки для main.py и worker.py — подключаются через parents=[...].
+    workers — значение --workers по умолчанию (у каждого скрипта своё).
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--since", default="2023-01-01", help="Начало периода (YYYY-MM-DD), по умолчанию 2023-01-01")
+    parser.add_argument("--until", help="Окончание периода (YYYY-MM-DD, не включительно). По умолчанию — сегодняшняя дата.")
+    parser.add_argument("--time", default="162000", help="HHMMSS (по умолчанию 162000); несколько через запятую — перебор кандидатов с запоминанием найденного")
+    parser.add_argument("--workers", type=int, default=workers, help=f"Сколько файлов скачивать параллельно (по умолчанию {workers}, 1 — последовательно)")
+    parser.add_argument("--cache-dir", default=os.path.join(STATE_DIR, "cache"), help="Каталог кэша скачанных бюллетеней")
+    parser.add_argument("--no-cache", action="store_true", help="Не использовать кэш, всегда качать заново")
+    parser.add_argument("--all-days", action="store_true", help="Запрашивать и выходные дни (по умолчанию пропускаются)")
+    parser.add_argument("--reader", choices=sorted(READERS), default="pandas", help="Реализация разбора .xls: pandas (read_excel) или xlrd (лёгкий читатель)")
+    parser.add_argument("--method", choices=["insert", "copy"], default="insert", help="Запись в БД: insert (INSERT ... ON CONFLICT) или copy (COPY во временную таблицу + один MERGE)")
+    parser.add_argument("--batch-days", type=int, default=1, help="Сколько дней писать одной транзакцией (по умолчанию 1)")
+    parser.add_argument("--no-aggregates", action="store_true", help="Не пересчитывать агрегаты динамики (spimex_daily/monthly_dynamics) после записи")
+    parser.add_argument("--base-url", default=BASE, help="Шаблон URL бюллетеня с {stamp} (для локального тестового сервера)")
+    parser.add_argument("--force", action="store_true", help="Игнорировать журнал загрузки: заново скачать, разобрать и записать все дни")
+    parser.add_argument("--recheck", action="store_true", help="Скачивать и уже загруженные дни, пропуская те, чей файл не изменился (sha256)")
+    parser.add_argument("--retries", type=int, default=3, help="Повторы при сетевых ошибках, 429 и 5xx (пауза удваивается с 1 с; по умолчанию 3)")
+    parser.add_argument("--no-notify", action="store_true", help="Не отправлять NOTIFY spimex_day_loaded после записи дня")
+    return parser
+
+
+def parse_loader_arguments(args: argparse.Namespace) -> Tuple[dt.date, dt.date, List[str]]:
+    """Проверка общих опций; возвращает (since, until, stamps) или завершает с сообщением."""
+    since = dt.datetime.strptime(args.since, "%Y-%m-%d").date()
+    until = dt.datetime.strptime(args.until, "%Y-%m-%d").date() if args.until else dt.date.today()
+    if since >= until:
+        raise SystemExit("since должно быть раньше until")
+    stamps = [t.strip() for t in args.time.split(",") if t.strip()]
+    if not stamps or not all(len(t) == 6 and t.isdigit() for t in stamps):
+        raise SystemExit("time — HHMMSS или список HHMMSS через запятую")
+    if args.workers < 1:
+        raise SystemExit("workers должно быть >= 1")
+    if args.batch_days < 1:
+        raise SystemExit("batch-days должно быть >= 1")
+    if args.retries < 0:
+        raise SystemExit("retries должно быть >= 0")
+    if "{stamp}" not in args.base_url:
+        raise SystemExit("base-url должен содержать {stamp}")
+    return since, until, stamps
@@ -10,3 +10,16 @@ DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_PORT = os.environ.get("DB_PORT", "5432")
 DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+
+# Каталог для локального состояния загрузчика (кэш бюллетеней и т.п.)
+STATE_DIR = os.environ.get("SPIMEX_STATE_DIR", ".spimex")
+
+# Секционирование spimex_trading_results по дате: "" (нет), "month" или "year".
+# Влияет только на создание новой таблицы.
+PARTITION_BY = os.environ.get("SPIMEX_PARTITION_BY", "").strip().lower()
+
+# Кэш запросов чтения (queries.py): пусто — в памяти процесса, redis://… — общий
+QUERY_CACHE_URL = os.environ.get("SPIMEX_QUERY_CACHE_URL", "")
+QUERY_CACHE_TTL = float(os.environ.get("SPIMEX_QUERY_CACHE_TTL", "600"))
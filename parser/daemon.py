@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import datetime as dt
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import requests
+
+import metrics
+from bulletin_cache import BulletinCache
+from downloader import BASE, DownloadError, fetch_status, iter_daily_files, make_session, url_for_day
+from journal import IngestJournal
+from loader import Loader
+from pipeline import parse_day
+from stamps import StampRegistry
+from trading_calendar import TradingCalendar
+
+
+# Биржа публикует бюллетени по московскому времени (UTC+3 без перехода на летнее)
+MSK = dt.timezone(dt.timedelta(hours=3), "MSK")
+
+
+class Clock:
+    """Источник времени и ожидания; в тестах подменяется фиктивным."""
+
+    def now(self) -> dt.datetime:
+        return dt.datetime.now(MSK)
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+@dataclass
+class PollSchedule:
+    """
+    Когда спрашивать файл за день: с publish_at - lead — часто (раз в min_interval),
+    после publish_at + fast — с удвоением паузы до max_interval, после give_up_at — до завтра.
+    """
+
+    publish_at: dt.time = dt.time(16, 20)
+    lead: dt.timedelta = dt.timedelta(minutes=10)
+    fast: dt.timedelta = dt.timedelta(minutes=30)
+    min_interval: float = 15.0
+    max_interval: float = 600.0
+    give_up_at: dt.time = dt.time(23, 30)
+
+    def window(self, day: dt.date) -> tuple[dt.datetime, dt.datetime, dt.datetime]:
+        """(начало опроса, конец частого опроса, отказ) для дня — в MSK."""
+        expected = dt.datetime.combine(day, self.publish_at, tzinfo=MSK)
+        return expected - self.lead, expected + self.fast, dt.datetime.combine(day, self.give_up_at, tzinfo=MSK)
+
+    def next_delay(self, now: dt.datetime, day: dt.date, slow_polls: int = 0) -> Optional[float]:
+        """
+        До начала опроса — пауза до него; внутри окна — пауза после очередного запроса;
+        None — на этот день всё. slow_polls — сколько раз уже спросили после частого опроса.
+        """
+        start, fast_end, give_up = self.window(day)
+        if now < start:
+            return (start - now).total_seconds()
+        if now >= give_up:
+            return None
+        if now < fast_end:
+            delay = self.min_interval
+        else:
+            delay = min(self.min_interval * 2 ** slow_polls, self.max_interval)
+        return min(delay, (give_up - now).total_seconds())
+
+
+class Daemon:
+    """
+    Постоянно работающий загрузчик «сегодняшнего» бюллетеня: соединения с БД и пул
+    HTTP держатся открытыми, файл за текущий торговый день запрашивается по
+    PollSchedule и загружается, как только появился.
+    """
+
+    def __init__(
+        self,
+        loader: Loader,
+        journal: IngestJournal,
+        stamps: Sequence[str] = ("162000",),
+        base: str = BASE,
+        schedule: Optional[PollSchedule] = None,
+        clock: Optional[Clock] = None,
+        calendar: Optional[TradingCalendar] = None,
+        registry: Optional[StampRegistry] = None,
+        reader: str = "pandas",
+        http: Optional[requests.Session] = None,
+    ) -> None:
+        self.loader = loader
+        self.journal = journal
+        self.stamps = list(stamps)
+        self.base = base
+        self.schedule = schedule or PollSchedule()
+        self.clock = clock or Clock()
+        self.calendar = calendar
+        self.registry = registry
+        self.reader = reader
+        self.http = http or make_session(len(self.stamps))
+        # состояние цикла run: текущий день, опросы после частого окна, ошибки подряд
+        self._day: Optional[dt.date] = None
+        self._slow_polls = 0
+        self._errors = 0
+
+    # ---------- один день ----------
+
+    def is_done(self, day: dt.date) -> bool:
+        self.journal.load(self.loader.session, day, day + dt.timedelta(days=1))
+        self.loader.session.commit()  # не держим транзакцию открытой до следующего опроса
+        return not self.journal.force and self.journal.is_done(day)
+
+    def poll(self, day: dt.date) -> Optional[tuple[str, bytes]]:
+        """Один запрос файла за день (по всем кандидатам stamp-а); None — пока нет."""
+        known = self.registry.get(day) if self.registry is not None else None
+        for stamp in ([known] if known else []) + [s for s in self.stamps if s != known]:
+            url = url_for_day(day, time_str=stamp, base=self.base)
+            try:
+                _, payload = fetch_status(url, session=self.http, retries=0)
+            except (DownloadError, requests.RequestException) as e:
+                print(f"[{day}] {e}")
+                continue
+            if payload is not None:
+                if self.registry is not None:
+                    self.registry.remember(day, stamp)
+                    self.registry.save()
+                return url, payload
+        return None
+
+    def ingest(self, day: dt.date, url: str, content: bytes) -> None:
+        for day, url, content in self.journal.filter([(day, url, content)]):
+            try:
+                rows = parse_day(day, content, reader=self.reader)
+            except Exception as e:
+                self.loader.parse_failed(day, e, url)
+                # файл мог быть выложен не целиком: run через _recover опросит день снова
+                raise
+            self.loader.write(day, url, rows)
+        self.loader.flush()
+        if self.calendar is not None:
+            self.calendar.mark_trading(day)
+            self.calendar.save()
+
+    # ---------- цикл ----------
+
+    def catch_up(self, days: int, cache: Optional[BulletinCache] = None) -> None:
+        """Догрузить последние days дней (например, после простоя демона)."""
+        today = self.clock.now().date()
+        start = today - dt.timedelta(days=days)
+        try:
+            self.journal.load(self.loader.session, start, today)
+            files = self.journal.filter(iter_daily_files(
+                start, today, time_str=self.stamps[0], stamps=self.stamps, base=self.base,
+                cache=cache, calendar=self.calendar, registry=self.registry,
+                exclude=self.journal.settled_done(today), on_failure=self.journal.failed,
+            ))
+            for day, url, content in files:
+                try:
+                    rows = parse_day(day, content, reader=self.reader)
+                except Exception as e:
+                    self.loader.parse_failed(day, e, url)
+                    continue
+                self.loader.write(day, url, rows)
+            self.loader.flush()
+            self.loader.session.commit()
+        except Exception as e:
+            # догрузка — не повод не ждать сегодняшний файл; недогруженное повторит следующий запуск
+            self._recover(e)
+
+    def _sleep_until(self, moment: dt.datetime) -> None:
+        seconds = (moment - self.clock.now()).total_seconds()
+        if seconds > 0:
+            self.clock.sleep(seconds)
+
+    def _recover(self, error: Exception) -> None:
+        """Откат после ошибки итерации и пауза: min_interval, удваивается с каждой ошибкой подряд."""
+        self._errors += 1
+        metrics.inc("daemon_errors")
+        print(f"[{self._day or self.clock.now().date()}] Ошибка: {type(error).__name__}: {error}")
+        try:
+            self.loader.discard()
+        except Exception as e:
+            print(f"Откат не удался ({type(e).__name__}: {e}) — соединение будет открыто заново")
+        self.clock.sleep(min(self.schedule.min_interval * 2 ** (self._errors - 1), self.schedule.max_interval))
+
+    def _step(self) -> int:
+        """Одна итерация: ожидание, запрос файла или его загрузка; возвращает число загруженных дней."""
+        now = self.clock.now()
+        if now.date() != self._day:
+            day = now.date()
+            skip = self.calendar is not None and not self.calendar.should_probe(day, self.stamps)
+            if skip or self.is_done(day):
+                print(f"[{day}] {'Неторговый день' if skip else 'Уже загружен'} — жду следующего")
+                self._sleep_until(self.schedule.window(day + dt.timedelta(days=1))[0])
+                return 0
+            # день запоминаем только после проверки: если она упала, повторится на следующей итерации
+            self._day, self._slow_polls = day, 0
+        day = self._day
+
+        delay = self.schedule.next_delay(now, day, self._slow_polls)
+        if delay is None:
+            print(f"[{day}] Файл так и не появился до {self.schedule.give_up_at:%H:%M} — жду следующего дня")
+            self._sleep_until(self.schedule.window(day + dt.timedelta(days=1))[0])
+            return 0
+        start, fast_end, _ = self.schedule.window(day)
+        if now < start:
+            self.clock.sleep(delay)
+            return 0
+
+        found = self.poll(day)
+        if found is not None:
+            url, content = found
+            delay_min = (self.clock.now() - (start + self.schedule.lead)).total_seconds() / 60
+            print(f"[{day}] Файл появился ({delay_min:+.1f} мин к ожидаемому времени)")
+            self.ingest(day, url, content)
+            self._sleep_until(self.schedule.window(day + dt.timedelta(days=1))[0])
+            return 1
+        if now >= fast_end:
+            self._slow_polls += 1
+        self.clock.sleep(delay)
+        return 0
+
+    def run(self, max_days: Optional[int] = None) -> None:
+        """
+        Бесконечный цикл (или до max_days загруженных дней — для тестов). Ошибка итерации
+        (БД, сеть, разбор) демона не останавливает: транзакция откатывается, и после паузы
+        день опрашивается заново.
+        """
+        loaded = 0
+        while max_days is None or loaded < max_days:
+            try:
+                loaded += self._step()
+            except Exception as e:
+                self._recover(e)
+            else:
+                self._errors = 0
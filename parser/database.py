@@ -2,7 +2,7 @@ from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy import create_engine
 from sqlalchemy.engine import URL
 
-from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from config import DB_HOST, DB_MAX_OVERFLOW, DB_NAME, DB_PASS, DB_POOL_SIZE, DB_PORT, DB_USER
 
 
 
@@ -17,11 +17,37 @@ DATABASE_URL = URL.create(
 
 Base = declarative_base()
 
+# Пространство ключей advisory-блокировок загрузчика: (LOCK_NAMESPACE, 0) — схема,
+# (LOCK_NAMESPACE, день.toordinal()) — день, (LOCK_NAMESPACE, -месяц.toordinal()) — агрегаты месяца
+LOCK_NAMESPACE = 0x53504D58  # "SPMX"
+
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     echo=False,
     future=True,
 )
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+def make_async_sessionmaker(pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW):
+    """
+    Асинхронный движок (SQLAlchemy asyncio поверх async-режима psycopg) и фабрика сессий к нему
+    для asyncio-приложений, читающих результаты; пул — DB_POOL_SIZE/DB_MAX_OVERFLOW.
+    Создаётся по требованию: синхронному загрузчику greenlet не нужен. Сам загрузчик
+    асинхронным не сделан: скачивание через requests и запись Loader-ом синхронны,
+    и обёртка в цикл событий повторяла бы --pipeline.
+    """
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        DATABASE_URL,
+        pool_pre_ping=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        echo=False,
+    )
+    return async_engine, async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
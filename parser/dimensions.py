@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, Iterable, List, Sequence
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import DeliveryBasis, ExchangeProduct, trading_results_wide
+
+
+
+WIDE_VIEW = "spimex_trading_results_wide"
+
+# Поле записи с названием -> (справочник, поле-ссылка в spimex_trading_results)
+NAME_FIELDS = {
+    "exchange_product_name": (ExchangeProduct, "exchange_product_name_id"),
+    "delivery_basis_name":   (DeliveryBasis,   "delivery_basis_name_id"),
+}
+
+def name_key(value: Any) -> str:
+    # пустое название (None/NaN, например в строках «Итого») храним пустой строкой
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value)
+
+def get_or_create_ids(session: Session, model, names: Iterable[str]) -> Dict[str, int]:
+    """
+    name -> id для набора названий: недостающие вставляются одним INSERT ... ON CONFLICT DO NOTHING,
+    затем все id читаются одним SELECT ... IN.
+
+    Справочник пополняется в отдельной короткой транзакции: новые названия сразу видны
+    параллельным загрузчикам (без ожидания их долгих транзакций и взаимных блокировок),
+    а id в кэше не пропадают при откате транзакции дня.
+    """
+    names = sorted(set(names))
+    if not names:
+        return {}
+    with session.get_bind().connect() as conn:
+        conn.execute(
+            insert(model).values([{"name": n} for n in names]).on_conflict_do_nothing(index_elements=["name"])
+        )
+        conn.commit()
+    rows = session.execute(select(model.name, model.id).where(model.name.in_(names)))
+    return dict(rows.all())
+
+
+class NameCache:
+    """
+    Кэш id справочников на время работы загрузчика: за пакет — не больше одного
+    похода в БД на справочник, и только за новыми названиями.
+    """
+
+    def __init__(self) -> None:
+        self._ids: Dict[type, Dict[str, int]] = {model: {} for model, _ in NAME_FIELDS.values()}
+
+    def resolve(self, session: Session, model, names: Iterable[str]) -> Dict[str, int]:
+        ids = self._ids[model]
+        missing = {n for n in names if n not in ids}
+        if missing:
+            ids.update(get_or_create_ids(session, model, missing))
+        return ids
+
+    def encode(self, session: Session, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Записи с названиями -> записи со ссылками на справочники."""
+        out = [dict(r) for r in records]
+        for field, (model, ref) in NAME_FIELDS.items():
+            keys = [name_key(r.pop(field, None)) for r in out]
+            ids = self.resolve(session, model, keys)
+            for r, key in zip(out, keys):
+                r[ref] = ids[key]
+        return out
+
+    def encode_rows(self, session: Session, rows: Iterable[Sequence[Any]], fields: Sequence[str]) -> List[tuple]:
+        """То же для кортежей в порядке fields: названия заменяются на id на своих местах."""
+        rows = [list(r) for r in rows]
+        for field, (model, _) in NAME_FIELDS.items():
+            i = fields.index(field)
+            for r in rows:
+                r[i] = name_key(r[i])
+            ids = self.resolve(session, model, (r[i] for r in rows))
+            for r in rows:
+                r[i] = ids[r[i]]
+        return [tuple(r) for r in rows]
+
+    def clear(self) -> None:
+        for ids in self._ids.values():
+            ids.clear()
+
+# ---------- Схема: view и перенос старых «широких» таблиц ----------
+
+def create_wide_view(conn: Connection) -> None:
+    """View с прежними колонками exchange_product_name/delivery_basis_name для старых потребителей."""
+    sql = trading_results_wide().compile(dialect=postgresql.dialect())
+    conn.execute(text(f"CREATE OR REPLACE VIEW {WIDE_VIEW} AS {sql}"))
+
+def has_wide_names(conn: Connection) -> bool:
+    """Есть ли spimex_trading_results в старой схеме — со строковыми колонками названий."""
+    insp = inspect(conn)
+    if not insp.has_table("spimex_trading_results"):
+        return False
+    return any(c["name"] in NAME_FIELDS for c in insp.get_columns("spimex_trading_results"))
+
+def migrate_wide_names(conn: Connection) -> bool:
+    """
+    Переводит существующую spimex_trading_results со строковыми колонками названий
+    на ссылки в справочники. Возвращает True, если перенос был.
+    Необратимо (исходные колонки удаляются) — запускается только явно: main.py --migrate-names.
+    """
+    if not has_wide_names(conn):
+        return False
+
+    for field, (model, ref) in NAME_FIELDS.items():
+        table = model.__tablename__
+        conn.execute(text(
+            f"INSERT INTO {table} (name) "
+            f"SELECT DISTINCT {field} FROM spimex_trading_results ORDER BY 1 "
+            f"ON CONFLICT (name) DO NOTHING"
+        ))
+        conn.execute(text(f"ALTER TABLE spimex_trading_results ADD COLUMN {ref} integer"))
+        conn.execute(text(
+            f"UPDATE spimex_trading_results r SET {ref} = d.id FROM {table} d WHERE d.name = r.{field}"
+        ))
+        conn.execute(text(f"ALTER TABLE spimex_trading_results ALTER COLUMN {ref} SET NOT NULL"))
+        conn.execute(text(
+            f"ALTER TABLE spimex_trading_results ADD CONSTRAINT spimex_trading_results_{ref}_fkey "
+            f"FOREIGN KEY ({ref}) REFERENCES {table} (id)"
+        ))
+        conn.execute(text(f"ALTER TABLE spimex_trading_results DROP COLUMN {field}"))
+    return True
@@ -1,42 +1,350 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import Iterator, Optional
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Container, Dict, Iterator, Optional, Sequence
 import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from bulletin_cache import BulletinCache
+from config import STATE_DIR
+from stamps import StampRegistry
+from trading_calendar import TradingCalendar
 
 
 
 BASE = "https://spimex.com/upload/reports/oil_xls/oil_xls_{stamp}.xls"
 HDRS = {"User-Agent": "Mozilla/5.0 (spimex-loader)"}
 
+# Ответы, после которых имеет смысл повторить запрос
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class DownloadError(RuntimeError):
+    """Файл не скачался: сеть/сервер не ответили и после повторов (или ответили неожиданно)."""
+
+    def __init__(self, url: str, reason: str) -> None:
+        super().__init__(f"{url}: {reason}")
+        self.url = url
+        self.reason = reason
+
+
 def daterange_days(start: dt.date, stop_exclusive: dt.date) -> Iterator[dt.date]:
     cur = start
     while cur < stop_exclusive:
         yield cur
         cur += dt.timedelta(days=1)
 
-def url_for_day(day: dt.date, time_str: str = "162000") -> str:
-    # time_str — "HHMMSS" (ровно 6 цифр)
-    return BASE.format(stamp=f"{day:%Y%m%d}{time_str}")
+def state_path(name: str, base: str = BASE) -> str:
+    """
+    Файл состояния источника (calendar.json, stamps.json): у биржи — в STATE_DIR,
+    у прочих base (тестовые серверы) — в своём подкаталоге, чтобы не портить боевой.
+    """
+    if base == BASE:
+        return os.path.join(STATE_DIR, name)
+    return os.path.join(STATE_DIR, "sources", hashlib.sha1(base.encode("utf-8")).hexdigest()[:12], name)
+
+def url_for_day(day: dt.date, time_str: str = "162000", base: str = BASE) -> str:
+    # time_str — "HHMMSS" (ровно 6 цифр); base — шаблон с {stamp} (можно подменить на локальный сервер)
+    return base.format(stamp=f"{day:%Y%m%d}{time_str}")
+
+def make_session(pool_size: int = 1) -> requests.Session:
+    """Сессия с пулом keep-alive соединений: до pool_size одновременных запросов к одному хосту."""
+    session = requests.Session()
+    session.headers.update(HDRS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _with_retries(
+    url: str,
+    send: Callable[[], requests.Response],
+    retries: int,
+    backoff: float,
+    sleep: Callable[[float], None],
+) -> requests.Response:
+    """
+    Сетевые ошибки, 429 и 5xx повторяются до retries раз с паузами backoff, 2*backoff, 4*backoff…;
+    если не помогло — DownloadError. Прочие ответы возвращаются как есть.
+    """
+    for attempt in range(retries + 1):
+        try:
+            resp = send()
+        except requests.RequestException as e:
+            reason = f"{type(e).__name__}: {e}"
+        else:
+            if resp.status_code not in RETRY_STATUSES:
+                return resp
+            reason = f"HTTP {resp.status_code}"
+        if attempt == retries:
+            raise DownloadError(url, f"{reason} (попыток: {retries + 1})")
+        metrics.inc("download_retries")
+        sleep(backoff * 2 ** attempt)
+
+def fetch_status(
+    url: str,
+    timeout: int = 30,
+    session: Optional[requests.Session] = None,
+    cache: Optional[BulletinCache] = None,
+    revalidate: bool = False,
+    retries: int = 3,
+    backoff: float = 1.0,
+    sleep: Callable[[float], None] = time.sleep,
+) -> tuple[int, Optional[bytes]]:
+    """
+    Скачивает файл и возвращает (200, содержимое) или (404, None) — файла нет.
+    С кэшем: старые дни отдаются с диска без сети, свежие (revalidate=True)
+    перепроверяются условным запросом (If-None-Match/If-Modified-Since).
+
+    Сетевые ошибки, 429 и 5xx повторяются до retries раз с паузами backoff, 2*backoff, 4*backoff…;
+    если не помогло (или ответ неожиданный) — DownloadError.
+    """
+    headers = dict(HDRS)
+    entry = cache.lookup(url) if cache is not None else None
+    cached: Optional[bytes] = None
+    if entry is not None:
+        if entry.get("status") == 200:
+            cached = cache.read(entry)
+            if cached is not None and not revalidate:
+                metrics.inc("cache_requests", result="hit")
+                return 200, cached
+            if cached is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+        elif not revalidate and cache.is_negative_fresh(entry):
+            metrics.inc("cache_requests", result="negative")
+            return 404, None
+
+    getter = session or requests
+
+    def get(headers: Dict[str, str]) -> requests.Response:
+        def send() -> requests.Response:
+            with metrics.timer("download"):
+                return getter.get(url, headers=headers, timeout=timeout)
+
+        return _with_retries(url, send, retries, backoff, sleep)
 
-def try_get(url: str, timeout: int = 30) -> Optional[bytes]:
-    resp = requests.get(url, headers=HDRS, timeout=timeout)
+    resp = get(headers)
+    if resp.status_code == 304:
+        if cached is not None:
+            metrics.inc("cache_requests", result="revalidated")
+            cache.touch(entry)
+            return 200, cached
+        # 304, а тела у нас нет (кэш потерян или прокси ответил на чужой запрос) — спрашиваем без условий
+        metrics.inc("http_responses", code=304)
+        resp = get({**HDRS, "Cache-Control": "no-cache"})
+    if cache is not None:
+        metrics.inc("cache_requests", result="miss")
+    metrics.inc("http_responses", code=resp.status_code)
     if resp.status_code == 200 and resp.content:
-        return resp.content
+        metrics.inc("download_bytes", len(resp.content))
+        if cache is not None:
+            cache.store(url, resp.content, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return 200, resp.content
     if resp.status_code in (404, 400):
-        return None
-    # На прочие коды — тоже None, но выведем для информации
-    return None
+        if cache is not None:
+            cache.store_missing(url)
+        return 404, None
+    raise DownloadError(url, f"HTTP {resp.status_code}" if resp.status_code != 200 else "пустой ответ")
 
-def iter_daily_files(start: dt.date, end_exclusive: dt.date, time_str: str = "162000") -> Iterator[tuple[dt.date, str, bytes]]:
+def try_get(
+    url: str,
+    timeout: int = 30,
+    session: Optional[requests.Session] = None,
+    cache: Optional[BulletinCache] = None,
+    revalidate: bool = False,
+    retries: int = 3,
+) -> Optional[bytes]:
+    """Скачивает файл; None — файла нет (404), прочие ошибки после повторов — DownloadError."""
+    return fetch_status(url, timeout=timeout, session=session, cache=cache, revalidate=revalidate, retries=retries)[1]
+
+def discover_stamp(
+    day: dt.date,
+    stamps: Sequence[str],
+    session: requests.Session,
+    pool: ThreadPoolExecutor,
+    base: str = BASE,
+    timeout: int = 10,
+    retries: int = 3,
+    backoff: float = 1.0,
+    sleep: Callable[[float], None] = time.sleep,
+) -> tuple[int, Optional[str]]:
+    """
+    Перебираем кандидатов HHMMSS параллельно лёгкими HEAD-запросами
+    (с теми же повторами, что и fetch_status; на 405 — GET первого байта).
+    Возвращает (статус, stamp): 200 и первый по порядку найденный stamp;
+    404 — ни одного файла нет; иной код — сервер отвечал ошибками (0 — не ответил и после повторов).
+    """
+    def head(stamp: str) -> int:
+        url = url_for_day(day, stamp, base=base)
+        resp = _with_retries(
+            url, lambda: session.head(url, timeout=timeout, allow_redirects=True), retries, backoff, sleep,
+        )
+        if resp.status_code == 405:
+            # HEAD запрещён — спрашиваем один байт; stream: если Range не поддержан, тело не качаем
+            resp = _with_retries(
+                url, lambda: session.get(url, headers={"Range": "bytes=0-0"}, timeout=timeout, stream=True),
+                retries, backoff, sleep,
+            )
+            resp.close()
+            if resp.status_code == 206:
+                return 200
+        return resp.status_code
+
+    futures = [(stamp, pool.submit(head, stamp)) for stamp in stamps]
+    statuses = []
+    for stamp, fut in futures:
+        try:
+            status = fut.result()
+        except DownloadError:
+            status = 0
+        if status == 200:
+            for _, rest in futures:
+                rest.cancel()
+            return 200, stamp
+        statuses.append(status)
+    if all(st in (404, 400) for st in statuses):
+        return 404, None
+    return next(st for st in statuses if st not in (404, 400)), None
+
+def iter_daily_files(
+    start: dt.date,
+    end_exclusive: dt.date,
+    time_str: str = "162000",
+    workers: int = 1,
+    base: str = BASE,
+    cache: Optional[BulletinCache] = None,
+    calendar: Optional[TradingCalendar] = None,
+    stamps: Optional[Sequence[str]] = None,
+    registry: Optional[StampRegistry] = None,
+    exclude: Optional[Container[dt.date]] = None,
+    retries: int = 3,
+    on_failure: Optional[Callable[[dt.date, DownloadError], None]] = None,
+) -> Iterator[tuple[dt.date, str, bytes]]:
     """
     Идём по дням, конструируем URL вида oil_xls_YYYYMMDDHHMMSS.xls и
     возвращаем (дата, url, контент) для существующих файлов.
+
+    При workers > 1 держим до workers запросов «в полёте» через пул потоков
+    (соединения переиспользуются), но отдаём результаты строго по порядку дат.
+
+    calendar — торговый календарь: заведомо неторговые дни не запрашиваем,
+    а результаты запросов (файл есть / 404) записываем в него.
+
+    stamps — несколько кандидатов HHMMSS вместо одного time_str: для дня без
+    запомненного в registry stamp-а они перебираются параллельно (HEAD), найденный
+    stamp запоминается.
+
+    exclude — дни, которые не нужно запрашивать (например, уже загруженные по журналу).
+    Если день не скачался и после retries повторов, это пишется в лог, вызывается
+    on_failure(day, error) и обход продолжается.
     """
-    for day in daterange_days(start, end_exclusive):
-        url = url_for_day(day, time_str=time_str)
-        payload = try_get(url)
-        if payload is None:
-            # файл за день отсутствует — пропускаем молча
-            continue
-        yield day, url, payload
+    today = dt.date.today()
+    candidates = list(stamps) if stamps else [time_str]
+
+    def get(day: dt.date, url: str) -> tuple[int, Optional[bytes]]:
+        revalidate = cache is not None and (today - day).days <= cache.recent_days
+        return fetch_status(url, session=session, cache=cache, revalidate=revalidate, retries=retries)
+
+    def fetch(day: dt.date) -> tuple[str, int, Optional[bytes]]:
+        if len(candidates) == 1:
+            url = url_for_day(day, time_str=candidates[0], base=base)
+            return (url, *get(day, url))
+
+        known = registry.get(day) if registry is not None else None
+        if known is not None:
+            url = url_for_day(day, time_str=known, base=base)
+            status, payload = get(day, url)
+            if payload is not None:
+                return url, status, payload
+            registry.forget(day)  # файл переехал — ищем заново
+
+        # уже скачанный ранее файл найдётся в кэше без сети
+        if cache is not None:
+            for stamp in candidates:
+                url = url_for_day(day, time_str=stamp, base=base)
+                entry = cache.lookup(url)
+                if entry is not None and entry.get("status") == 200:
+                    status, payload = get(day, url)
+                    if payload is not None:
+                        if registry is not None:
+                            registry.remember(day, stamp)
+                        return url, status, payload
+
+        status, stamp = discover_stamp(day, candidates, session, probe_pool, base=base, retries=retries)
+        if stamp is None:
+            url = url_for_day(day, time_str=candidates[0], base=base)
+            if status != 404:
+                raise DownloadError(url, f"ни один из stamp-ов не ответил (статус {status})")
+            return url, status, None
+        if registry is not None:
+            registry.remember(day, stamp)
+        url = url_for_day(day, time_str=stamp, base=base)
+        return (url, *get(day, url))
+
+    def learn(day: dt.date, status: int) -> None:
+        if calendar is None:
+            return
+        if status == 200:
+            calendar.mark_trading(day)
+        elif status == 404:
+            # fetch отдаёт 404, только если файла нет ни под одним из candidates
+            calendar.mark_missing(day, stamps=candidates, today=today)
+
+    def settle(day: dt.date, result: Callable[[], tuple[str, int, Optional[bytes]]]) -> Optional[tuple[dt.date, str, bytes]]:
+        # результат запроса -> элемент для yield (None — файла нет или он не скачался)
+        try:
+            url, status, payload = result()
+        except DownloadError as e:
+            print(f"[{day}] Не удалось скачать: {e}")
+            if on_failure is not None:
+                on_failure(day, e)
+            return None
+        learn(day, status)
+        return None if payload is None else (day, url, payload)
+
+    days = daterange_days(start, end_exclusive)
+    if calendar is not None:
+        days = (d for d in days if calendar.should_probe(d, candidates))
+    if exclude:
+        days = (d for d in days if d not in exclude)
+
+    probe_workers = workers * len(candidates) if len(candidates) > 1 else 1
+    try:
+        with make_session(workers + probe_workers) as session, \
+                ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix="spimex-probe") as probe_pool:
+            if workers <= 1:
+                for day in days:
+                    item = settle(day, lambda: fetch(day))
+                    if item is not None:
+                        yield item
+                return
+
+            # окно ограничено: не больше 2*workers готовых/ожидающих ответов в памяти
+            window: deque = deque()
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spimex-dl") as pool:
+                for day in days:
+                    window.append((day, pool.submit(fetch, day)))
+                    if len(window) >= 2 * workers:
+                        day, fut = window.popleft()
+                        item = settle(day, fut.result)
+                        if item is not None:
+                            yield item
+                while window:
+                    day, fut = window.popleft()
+                    item = settle(day, fut.result)
+                    if item is not None:
+                        yield item
+    finally:
+        if calendar is not None:
+            calendar.save()
+        if registry is not None:
+            registry.save()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import gzip
+import sys
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Sequence
+
+from sqlalchemy import Date, DateTime, Integer, Numeric, String
+from sqlalchemy.engine import Connection
+
+from database import engine
+from models import SpimexTradingResult, trading_results_wide
+
+
+
+FORMATS = ("csv", "parquet")
+
+# Сколько строк за раз забирать с серверного курсора / писать группой строк Parquet
+CHUNK_ROWS = 50_000
+
+def export_query(
+    since: Optional[dt.date] = None,
+    until: Optional[dt.date] = None,
+    oil_ids: Sequence[str] = (),
+    service_columns: bool = False,
+):
+    """Результаты в «широкой» форме за [since, until) и по oil_id, по порядку дат."""
+    T = SpimexTradingResult
+    stmt = trading_results_wide(service_columns=service_columns)
+    if since is not None:
+        stmt = stmt.where(T.date >= since)
+    if until is not None:
+        stmt = stmt.where(T.date < until)
+    if oil_ids:
+        stmt = stmt.where(T.oil_id.in_(list(oil_ids)))
+    return stmt.order_by(T.date, T.id)
+
+@contextmanager
+def _open_output(path: str) -> Iterator[BinaryIO]:
+    # "-" — stdout, *.gz — сжатие на лету
+    if path == "-":
+        yield sys.stdout.buffer
+    elif path.endswith(".gz"):
+        with gzip.open(path, "wb", compresslevel=5) as f:
+            yield f
+    else:
+        with open(path, "wb") as f:
+            yield f
+
+# ---------- CSV: COPY (SELECT ...) TO STDOUT ----------
+
+def export_csv(conn: Connection, stmt, out: BinaryIO) -> int:
+    """
+    Пишет результат stmt в out как CSV с заголовком. Строки формирует сам Postgres
+    (COPY TO STDOUT) и отдаёт блоками — в памяти только текущий блок.
+    """
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    raw = conn.connection.driver_connection  # psycopg.Connection
+    with raw.cursor() as cur:
+        with cur.copy(f"COPY ({compiled}) TO STDOUT WITH (FORMAT csv, HEADER)", compiled.params) as copy:
+            for block in copy:
+                out.write(block)
+        return cur.rowcount
+
+# ---------- Parquet: серверный курсор + ParquetWriter ----------
+
+def _arrow_schema(pa, columns):
+    def arrow_type(sa_type):
+        if isinstance(sa_type, Numeric):
+            return pa.decimal128(sa_type.precision, sa_type.scale)
+        if isinstance(sa_type, Integer):
+            return pa.int64()
+        if isinstance(sa_type, DateTime):
+            return pa.timestamp("us", tz="UTC" if sa_type.timezone else None)
+        if isinstance(sa_type, Date):
+            return pa.date32()
+        if isinstance(sa_type, String):
+            return pa.string()
+        raise TypeError(f"Нет соответствия в Arrow для {sa_type!r}")
+
+    return pa.schema([pa.field(c.name, arrow_type(c.type), nullable=True) for c in columns])
+
+def export_parquet(conn: Connection, stmt, path: str, chunk_rows: int = CHUNK_ROWS) -> int:
+    """
+    Пишет результат stmt в Parquet: строки идут через серверный курсор пачками по
+    chunk_rows, каждая пачка — отдельная группа строк файла.
+    """
+    from archive import _pyarrow
+
+    pa, pq = _pyarrow()
+    schema = _arrow_schema(pa, stmt.selected_columns)
+    decimals = [i for i, field in enumerate(schema) if pa.types.is_decimal(field.type)]
+    total = 0
+    result = conn.execution_options(yield_per=chunk_rows).execute(stmt)
+    with pq.ParquetWriter(sys.stdout.buffer if path == "-" else path, schema, compression="zstd") as writer:
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            for i in decimals:  # NaN в numeric (строки «Итого») в decimal128 не представим
+                columns[i] = [None if v is not None and v.is_nan() else v for v in columns[i]]
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema,
+            ))
+            total += len(rows)
+    return total
+
+def export(
+    path: str,
+    fmt: str,
+    since: Optional[dt.date] = None,
+    until: Optional[dt.date] = None,
+    oil_ids: Sequence[str] = (),
+    service_columns: bool = False,
+    chunk_rows: int = CHUNK_ROWS,
+) -> int:
+    """Выгрузка в path ("-" — stdout) в формате fmt; возвращает число строк."""
+    stmt = export_query(since, until, oil_ids, service_columns)
+    # один снимок данных на всю выгрузку, даже если загрузчик пишет параллельно
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True) as conn:
+        if fmt == "csv":
+            with _open_output(path) as out:
+                return export_csv(conn, stmt, out)
+        return export_parquet(conn, stmt, path, chunk_rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка результатов торгов SPIMEX в CSV/Parquet")
+    parser.add_argument("output", help="Файл выгрузки: .csv, .csv.gz или .parquet; \"-\" — stdout")
+    parser.add_argument("--format", choices=FORMATS, help="Формат (по умолчанию — по расширению файла, иначе csv)")
+    parser.add_argument("--since", help="Начало периода (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Окончание периода (YYYY-MM-DD, не включительно)")
+    parser.add_argument("--oil-id", action="append", default=[], help="Код oil_id; можно несколько раз или через запятую")
+    parser.add_argument("--service-columns", action="store_true", help="Добавить created_on/updated_on")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help=f"Строк за одну выборку для Parquet (по умолчанию {CHUNK_ROWS})")
+    args = parser.parse_args()
+
+    since = dt.datetime.strptime(args.since, "%Y-%m-%d").date() if args.since else None
+    until = dt.datetime.strptime(args.until, "%Y-%m-%d").date() if args.until else None
+    if since and until and since >= until:
+        raise SystemExit("since должно быть раньше until")
+    if args.chunk_rows < 1:
+        raise SystemExit("chunk-rows должно быть >= 1")
+    oil_ids = sorted({o.strip() for arg in args.oil_id for o in arg.split(",") if o.strip()})
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+
+    started = time.perf_counter()
+    rows = export(args.output, fmt, since, until, oil_ids, args.service_columns, args.chunk_rows)
+    # итог — в stderr, чтобы не смешиваться с выгрузкой в stdout
+    print(f"Выгружено строк: {rows} за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
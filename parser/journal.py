@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+import metrics
+from database import engine
+from models import SpimexIngestJournal
+
+
+
+# Дни с такими статусами считаются загруженными (missing — файла нет; для свежих дней
+# это не окончательно, поэтому пропускаются только «устоявшиеся» дни, см. settled_done)
+DONE_STATUSES = ("done", "empty", "missing")
+
+def mark(
+    session_or_conn,
+    day: dt.date,
+    status: str,
+    url: Optional[str] = None,
+    sha256: Optional[str] = None,
+    rows: int = 0,
+    error: Optional[str] = None,
+    started_on: Optional[dt.datetime] = None,
+) -> None:
+    """Запись журнала за день (UPSERT, attempts + 1). Коммит — на вызывающей стороне."""
+    J = SpimexIngestJournal
+    stmt = insert(J).values(
+        date=day, status=status, url=url, sha256=sha256, rows=rows, attempts=1,
+        last_error=error, started_on=started_on, finished_on=func.now(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["date"],
+        set_={
+            "status": stmt.excluded.status,
+            "url": func.coalesce(stmt.excluded.url, J.url),
+            "sha256": func.coalesce(stmt.excluded.sha256, J.sha256),
+            "rows": stmt.excluded.rows,
+            "attempts": J.attempts + 1,
+            "last_error": stmt.excluded.last_error,
+            "started_on": stmt.excluded.started_on,
+            "finished_on": stmt.excluded.finished_on,
+        },
+    )
+    session_or_conn.execute(stmt)
+
+
+class IngestJournal:
+    """
+    Журнал загрузки в таблице spimex_ingest_journal: статус, sha256 файла, число строк,
+    попытки и время по каждому дню. Позволяет продолжить прерванный прогон:
+
+    - загруженные дни старше settle_days не запрашиваются вовсе (settled_done);
+    - более свежие (и все при recheck) скачиваются, но если sha256 файла совпал с
+      журналом — разбор и запись пропускаются (filter);
+    - force — журнал только пишется, пропусков нет.
+
+    Отметки «done» пишет Loader в той же транзакции, что и строки дня; ошибки —
+    сразу отдельной транзакцией (failed).
+    """
+
+    def __init__(self, settle_days: int = 3, recheck: bool = False, force: bool = False) -> None:
+        self.settle_days = settle_days
+        self.recheck = recheck
+        self.force = force
+        self.entries: Dict[dt.date, Tuple[str, Optional[str]]] = {}
+        # день -> (sha256, когда скачан) для дней, прошедших filter
+        self._seen: Dict[dt.date, Tuple[str, dt.datetime]] = {}
+
+    def load(self, session: Session, start: dt.date, end_exclusive: dt.date) -> None:
+        J = SpimexIngestJournal
+        rows = session.execute(
+            select(J.date, J.status, J.sha256).where(J.date >= start, J.date < end_exclusive)
+        )
+        self.entries = {day: (status, sha) for day, status, sha in rows}
+
+    def is_done(self, day: dt.date) -> bool:
+        entry = self.entries.get(day)
+        return entry is not None and entry[0] in DONE_STATUSES
+
+    def settled_done(self, today: Optional[dt.date] = None) -> Set[dt.date]:
+        """Загруженные дни, которые можно не запрашивать у биржи."""
+        if self.force or self.recheck:
+            return set()
+        edge = (today or dt.date.today()) - dt.timedelta(days=self.settle_days)
+        return {day for day in self.entries if day < edge and self.is_done(day)}
+
+    def filter(self, files: Iterable[tuple[dt.date, str, bytes]]) -> Iterator[tuple[dt.date, str, bytes]]:
+        """Пропускает файлы, совпадающие с уже загруженными; остальные запоминает для отметки."""
+        try:
+            for day, url, content in files:
+                sha = hashlib.sha256(content).hexdigest()
+                if not self.force and self.is_done(day) and self.entries[day][1] == sha:
+                    metrics.inc("journal_skipped")
+                    print(f"[{day}] Файл не изменился с прошлой загрузки — пропускаю")
+                    continue
+                self._seen[day] = (sha, dt.datetime.now(dt.timezone.utc))
+                yield day, url, content
+        finally:
+            close = getattr(files, "close", None)
+            if close is not None:
+                close()
+
+    def mark_loaded(self, session: Session, day: dt.date, url: str, rows: int, status: str = "done") -> None:
+        sha, started_on = self._seen.pop(day, (None, None))
+        mark(session, day, status, url=url, sha256=sha, rows=rows, started_on=started_on)
+        self.entries[day] = (status, sha)
+
+    def mark_missing(self, session: Session, day: dt.date) -> None:
+        mark(session, day, "missing")
+        self.entries[day] = ("missing", None)
+
+    def failed(self, day: dt.date, error: BaseException, url: Optional[str] = None) -> None:
+        """Ошибка скачивания/разбора: пишется сразу, день будет повторён следующим прогоном."""
+        sha, started_on = self._seen.pop(day, (None, None))
+        with engine.begin() as conn:
+            mark(conn, day, "failed", url=url or getattr(error, "url", None), sha256=sha,
+                 error=f"{type(error).__name__}: {error}", started_on=started_on)
+        self.entries[day] = ("failed", sha)
@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import datetime as dt
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import literal_column, or_, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+import metrics
+import notify
+import queries
+from aggregates import refresh_days
+from config import PARTITION_BY
+from database import LOCK_NAMESPACE, engine, Base
+from dimensions import NAME_FIELDS, NameCache, create_wide_view, has_wide_names, migrate_wide_names
+from journal import IngestJournal
+from models import SpimexTradingResult
+from partitions import ensure_partitions
+from parser import RECORD_FIELDS
+
+
+
+def init_db(since: Optional[dt.date] = None, until: Optional[dt.date] = None) -> None:
+    with engine.begin() as conn:
+        # несколько загрузчиков, стартующих разом, создают схему по очереди
+        conn.execute(text("SELECT pg_advisory_xact_lock(:ns, 0)"), {"ns": LOCK_NAMESPACE})
+        if has_wide_names(conn):
+            raise SystemExit(
+                "spimex_trading_results в старой схеме (названия строками, без справочников). "
+                "Сделайте резервную копию БД и выполните: python main.py --migrate-names"
+            )
+        Base.metadata.create_all(bind=conn)
+        create_wide_view(conn)
+        # create_all не трогает уже существующие таблицы — индексы досоздаём отдельно
+        for index in SpimexTradingResult.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+        if PARTITION_BY and since is not None and until is not None:
+            for name in ensure_partitions(conn, since, until):
+                print(f"Создана секция: {name}")
+
+def migrate_names() -> bool:
+    """
+    Явный перенос названий старой схемы в справочники exchange_product/delivery_basis
+    (одной транзакцией, под той же блокировкой схемы, что и init_db). True — перенос был.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:ns, 0)"), {"ns": LOCK_NAMESPACE})
+        Base.metadata.create_all(bind=conn)  # справочники, если их ещё нет
+        return migrate_wide_names(conn)
+
+# У PostgreSQL не больше 65535 параметров на запрос — режем INSERT на пачки
+_MAX_PARAMS = 65535
+
+# Поля строки в БД: RECORD_FIELDS, где названия заменены ссылками на справочники
+STORE_FIELDS = tuple(NAME_FIELDS[f][1] if f in NAME_FIELDS else f for f in RECORD_FIELDS)
+
+# Поля, которые обновляем при конфликте; строку трогаем, только если хоть одно изменилось
+_UPDATE_FIELDS = (
+    "exchange_product_name_id",
+    "delivery_basis_name_id",
+    "oil_id",
+    "delivery_basis_id",
+    "delivery_type_id",
+    "volume",
+    "total",
+    "count",
+)
+
+@dataclass
+class UpsertStats:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0  # повторы (exchange_product_id, date) в пакете: пишется последний
+    # те же счётчики по датам торгов
+    by_day: Dict[dt.date, "UpsertStats"] = field(default_factory=dict, repr=False, compare=False)
+
+    def __add__(self, other: "UpsertStats") -> "UpsertStats":
+        by_day = dict(self.by_day)
+        for day, stats in other.by_day.items():
+            by_day[day] = by_day[day] + stats if day in by_day else stats
+        return UpsertStats(
+            self.inserted + other.inserted,
+            self.updated + other.updated,
+            self.unchanged + other.unchanged,
+            self.duplicates + other.duplicates,
+            by_day,
+        )
+
+    def __str__(self) -> str:
+        s = f"inserted={self.inserted}, updated={self.updated}, unchanged={self.unchanged}"
+        return f"{s}, duplicates={self.duplicates}" if self.duplicates else s
+
+# У новой строки created_on и updated_on — одно и то же now() транзакции, у обновлённой
+# updated_on свежее. (xmax = 0 не подходит: на секционированной таблице его нельзя вернуть.)
+_INSERTED_FLAG = "(created_on = updated_on)"
+
+def _stats_from_returning(
+    returned: Iterable[tuple[bool, dt.date]], offered: Counter, duplicates: Optional[Counter] = None,
+) -> UpsertStats:
+    # RETURNING _INSERTED_FLAG, date: True — новая строка, False — обновлённая; остальные не тронуты.
+    # offered — строк по дням до отбрасывания повторов, duplicates — сколько из них повторы
+    duplicates = duplicates or Counter()
+    by_day = {day: UpsertStats(duplicates=duplicates[day]) for day in offered}
+    for inserted, day in returned:
+        stats = by_day.setdefault(day, UpsertStats())
+        if inserted:
+            stats.inserted += 1
+        else:
+            stats.updated += 1
+    for day, stats in by_day.items():
+        stats.unchanged = max(offered[day] - stats.duplicates - stats.inserted - stats.updated, 0)
+    return UpsertStats(
+        sum(s.inserted for s in by_day.values()),
+        sum(s.updated for s in by_day.values()),
+        sum(s.unchanged for s in by_day.values()),
+        sum(s.duplicates for s in by_day.values()),
+        by_day,
+    )
+
+def _dedup_last(records: List[dict]) -> tuple[List[dict], Counter]:
+    """Последняя запись на (exchange_product_id, date) — как в COPY-пути; повторы по дням."""
+    latest: Dict[tuple, dict] = {}
+    for r in records:
+        latest[(r["exchange_product_id"], r["date"])] = r
+    duplicates = Counter(r["date"] for r in records)
+    duplicates.subtract(r["date"] for r in latest.values())
+    return list(latest.values()), +duplicates
+
+def upsert_results(session: Session, records: Iterable[dict], names: Optional[NameCache] = None) -> UpsertStats:
+    """
+    UPSERT по (exchange_product_id, date).
+    Совпадающие строки не переписываются (без лишних версий строк и WAL);
+    возвращает счётчики новых/обновлённых/неизменных строк.
+    names — кэш id справочников названий (у загрузчика общий на весь прогон).
+    """
+    records = list(records)
+    if not records:
+        return UpsertStats()
+    offered = Counter(r["date"] for r in records)
+    # один INSERT ... ON CONFLICT DO UPDATE не может задеть строку дважды — повторы убираем заранее
+    records, duplicates = _dedup_last(records)
+    records = (names or NameCache()).encode(session, records)
+
+    table = SpimexTradingResult.__table__
+    chunk = max(_MAX_PARAMS // len(records[0]), 1)
+    returned: List[tuple[bool, dt.date]] = []
+    for i in range(0, len(records), chunk):
+        part = records[i : i + chunk]
+        stmt = insert(SpimexTradingResult).values(part)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["exchange_product_id", "date"],
+            set_={
+                **{f: stmt.excluded[f] for f in _UPDATE_FIELDS},
+                "updated_on": stmt.excluded.updated_on,
+            },
+            where=or_(*(table.c[f].is_distinct_from(stmt.excluded[f]) for f in _UPDATE_FIELDS)),
+        ).returning(literal_column(_INSERTED_FLAG), table.c.date)
+        returned += session.execute(stmt).tuples()
+    return _stats_from_returning(returned, offered, duplicates)
+
+# ---------- COPY в промежуточную таблицу + один MERGE ----------
+
+STAGE_TABLE = "spimex_trading_results_stage"
+
+_STAGE_DDL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+    exchange_product_id   varchar(32),
+    exchange_product_name_id integer,
+    delivery_basis_name_id   integer,
+    oil_id                varchar(4),
+    delivery_basis_id     varchar(3),
+    delivery_type_id      varchar(1),
+    volume                numeric(18, 6),
+    total                 numeric(18, 2),
+    count                 integer,
+    date                  date,
+    seq                   integer  -- порядок строки в пакете: из повторов побеждает последняя
+) ON COMMIT DELETE ROWS
+"""
+
+_COLS = ", ".join(STORE_FIELDS)
+
+_MERGE_SQL = f"""
+INSERT INTO spimex_trading_results ({_COLS})
+SELECT DISTINCT ON (exchange_product_id, date) {_COLS}
+FROM {STAGE_TABLE}
+ORDER BY exchange_product_id, date, seq DESC
+ON CONFLICT ON CONSTRAINT uq_spimex_result_pid_date DO UPDATE SET
+    exchange_product_name_id = EXCLUDED.exchange_product_name_id,
+    delivery_basis_name_id   = EXCLUDED.delivery_basis_name_id,
+    oil_id                = EXCLUDED.oil_id,
+    delivery_basis_id     = EXCLUDED.delivery_basis_id,
+    delivery_type_id      = EXCLUDED.delivery_type_id,
+    volume                = EXCLUDED.volume,
+    total                 = EXCLUDED.total,
+    count                 = EXCLUDED.count,
+    updated_on            = now()
+WHERE (
+    spimex_trading_results.exchange_product_name_id, spimex_trading_results.delivery_basis_name_id,
+    spimex_trading_results.oil_id, spimex_trading_results.delivery_basis_id,
+    spimex_trading_results.delivery_type_id, spimex_trading_results.volume,
+    spimex_trading_results.total, spimex_trading_results.count
+) IS DISTINCT FROM (
+    EXCLUDED.exchange_product_name_id, EXCLUDED.delivery_basis_name_id,
+    EXCLUDED.oil_id, EXCLUDED.delivery_basis_id,
+    EXCLUDED.delivery_type_id, EXCLUDED.volume,
+    EXCLUDED.total, EXCLUDED.count
+)
+RETURNING {_INSERTED_FLAG}, date
+"""
+
+_DATE_POS = RECORD_FIELDS.index("date")
+_PID_POS = RECORD_FIELDS.index("exchange_product_id")
+_OIL_POS = RECORD_FIELDS.index("oil_id")
+
+def copy_upsert_results(session: Session, rows: Iterable[tuple], names: Optional[NameCache] = None) -> UpsertStats:
+    """
+    Тот же UPSERT, но строки (кортежи в порядке RECORD_FIELDS) льются через COPY
+    во временную таблицу, а в spimex_trading_results попадают одним INSERT ... SELECT.
+    Без лимита на число параметров; коммит — на вызывающей стороне.
+    Повторы (exchange_product_id, date) отбрасывает DISTINCT ON — остаётся последний, как в upsert_results.
+    """
+    rows = (names or NameCache()).encode_rows(session, rows, RECORD_FIELDS)
+    conn = session.connection()
+    conn.exec_driver_sql(_STAGE_DDL)
+    raw = conn.connection.driver_connection  # psycopg.Connection
+    staged: Counter = Counter()
+    duplicates: Counter = Counter()
+    seen = set()
+    with raw.cursor() as cur:
+        with cur.copy(f"COPY {STAGE_TABLE} ({_COLS}, seq) FROM STDIN") as copy:
+            for seq, row in enumerate(rows):
+                copy.write_row((*row, seq))
+                key = (row[_PID_POS], row[_DATE_POS])
+                staged[key[1]] += 1
+                if key in seen:
+                    duplicates[key[1]] += 1
+                seen.add(key)
+    returned = conn.exec_driver_sql(_MERGE_SQL).all()
+    conn.exec_driver_sql(f"TRUNCATE {STAGE_TABLE}")
+    return _stats_from_returning(returned, staged, duplicates)
+
+
+class Loader:
+    """
+    Запись разобранных дней в БД с построчным логом и итогами.
+    Один экземпляр — одна сессия; используется и в последовательном режиме, и в конвейере.
+
+    method — "insert" (INSERT ... ON CONFLICT) или "copy" (COPY + MERGE);
+    batch_days — сколько дней копить перед одной транзакцией;
+    aggregates — пересчитывать агрегаты динамики по изменившимся датам в той же транзакции;
+    journal — журнал загрузки: отметки о днях пишутся в той же транзакции, что и их строки;
+    notify — после коммита каждого изменившегося дня подписчики получают NOTIFY (см. notify.py).
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        method: str = "insert",
+        batch_days: int = 1,
+        aggregates: bool = True,
+        journal: Optional[IngestJournal] = None,
+        notify: bool = True,
+    ) -> None:
+        self.session = session
+        self.method = method
+        self.batch_days = max(batch_days, 1)
+        self.aggregates = aggregates
+        self.journal = journal
+        self.notify = notify
+        # (день, url, строки-кортежи в порядке RECORD_FIELDS — как их отдаёт parse_day)
+        self.pending: List[tuple[dt.date, str, List[tuple]]] = []
+        self.empty: List[tuple[dt.date, str]] = []  # дни без строк — только для журнала
+        self.total_days = 0
+        self.total_files = 0
+        self.total_rows = 0
+        self.stats = UpsertStats()
+        self.names = NameCache()
+
+    def parse_failed(self, day: dt.date, error: BaseException, url: Optional[str] = None) -> None:
+        self.total_days += 1
+        metrics.inc("parse_errors")
+        print(f"[{day}] Пропуск из-за ошибки парсинга: {error}")
+        if self.journal is not None:
+            self.journal.failed(day, error, url)
+
+    def write(self, day: dt.date, url: str, rows: List[tuple]) -> None:
+        self.total_days += 1
+        if not rows:
+            print(f"[{day}] Нет строк с count>0 — пропускаю")
+            if self.journal is not None:
+                self.empty.append((day, url))
+            return
+
+        self.pending.append((day, url, rows))
+        if len(self.pending) >= self.batch_days:
+            self.flush()
+
+    def discard(self) -> None:
+        """Откат после ошибки записи: транзакция и ещё не записанные дни отбрасываются."""
+        self.pending.clear()
+        self.empty.clear()
+        self.session.rollback()
+
+    def flush(self) -> None:
+        """Пишем накопленные дни одной транзакцией."""
+        if not self.pending:
+            if self.empty:
+                self._mark_journal([])
+                self.session.commit()
+            return
+        batch, self.pending = self.pending, []
+        rows = [r for _, _, day_rows in batch for r in day_rows]
+
+        with metrics.timer("upsert", method=self.method):
+            if self.method == "copy":
+                stats = copy_upsert_results(self.session, rows, self.names)
+            else:
+                # словари нужны только INSERT ... VALUES
+                stats = upsert_results(self.session, [dict(zip(RECORD_FIELDS, r)) for r in rows], self.names)
+        changed = [day for day, st in sorted(stats.by_day.items()) if st.inserted or st.updated]
+        if self.aggregates and changed:
+            with metrics.timer("aggregates"):
+                refresh_days(self.session, changed)
+        if self.notify:
+            days = ((day, len(day_rows), (r[_OIL_POS] for r in day_rows)) for day, _, day_rows in batch)
+            for event in notify.events_for_batch(days, stats.by_day):
+                notify.publish(self.session, event)
+        self._mark_journal(batch)
+        with metrics.timer("commit"):
+            self.session.commit()
+        if stats.inserted or stats.updated:
+            # кэш этого процесса (или общий Redis); читатели в других процессах
+            # узнают о новом дне по NOTIFY — queries.start_invalidation_listener
+            queries.invalidate()
+        metrics.inc("rows", stats.inserted, stage="upsert", result="inserted")
+        metrics.inc("rows", stats.updated, stage="upsert", result="updated")
+        metrics.inc("rows", stats.unchanged, stage="upsert", result="unchanged")
+        metrics.inc("rows", stats.duplicates, stage="upsert", result="duplicate")
+        metrics.inc("days_loaded", len(batch))
+        metrics.flush()
+
+        self.total_files += len(batch)
+        self.total_rows  += len(rows)
+        self.stats += stats
+        if len(batch) == 1:
+            day, url, day_rows = batch[0]
+            print(f"[{day}] OK: {len(day_rows)} строк ({stats}) из {url}")
+            return
+        for day, url, day_rows in batch:
+            print(f"[{day}] OK: {len(day_rows)} строк ({stats.by_day.get(day, UpsertStats())}) из {url}")
+        print(f"[{batch[0][0]}..{batch[-1][0]}] Пакет из {len(batch)} дней: {stats}")
+
+    def _mark_journal(self, batch: List[tuple[dt.date, str, List[tuple]]]) -> None:
+        if self.journal is None:
+            return
+        for day, url, day_rows in batch:
+            self.journal.mark_loaded(self.session, day, url, len(day_rows))
+        for day, url in self.empty:
+            self.journal.mark_loaded(self.session, day, url, 0, status="empty")
+        self.empty = []
+
+    def summary(self) -> str:
+        return (
+            f"Готово. Дней просмотрено: {self.total_days}, файлов загружено: {self.total_files}, "
+            f"строк записано: {self.total_rows} "
+            f"(новых: {self.stats.inserted}, обновлено: {self.stats.updated}, без изменений: {self.stats.unchanged}"
+            + (f", повторов в файлах: {self.stats.duplicates})" if self.stats.duplicates else ")")
+        )
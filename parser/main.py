@@ -2,89 +2,148 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
-from typing import Iterable
-
-from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.orm import Session
-
-from database import engine, Base, SessionLocal
-from models import SpimexTradingResult
-from downloader import iter_daily_files
-from parser import parse_bulletin_xls, to_records
-
-
-
-def init_db() -> None:
-    Base.metadata.create_all(bind=engine)
-
-def upsert_results(session: Session, records: Iterable[dict]) -> int:
-    """
-    UPSERT по (exchange_product_id, date).
-    Возвращает число затронутых строк (для логов).
-    """
-    records = list(records)
-    if not records:
-        return 0
-
-    stmt = insert(SpimexTradingResult).values(records)
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["exchange_product_id", "date"],
-        set_={
-            "exchange_product_name": stmt.excluded.exchange_product_name,
-            "delivery_basis_name":   stmt.excluded.delivery_basis_name,
-            "oil_id":                stmt.excluded.oil_id,
-            "delivery_basis_id":     stmt.excluded.delivery_basis_id,
-            "delivery_type_id":      stmt.excluded.delivery_type_id,
-            "volume":                stmt.excluded.volume,
-            "total":                 stmt.excluded.total,
-            "count":                 stmt.excluded.count,
-            "updated_on":            stmt.excluded.updated_on,
-        },
-    )
-    res = session.execute(stmt)
-    return res.rowcount or 0
+from contextlib import closing
 
-def main():
-    parser = argparse.ArgumentParser(description="SPIMEX oil bulletin loader")
-    parser.add_argument("--since", default="2023-01-01", help="Начало периода (YYYY-MM-DD), по умолчанию 2023-01-01")
-    parser.add_argument("--until", help="Окончание периода (YYYY-MM-DD, не включительно). По умолчанию — сегодняшняя дата.")
-    parser.add_argument("--time", default="162000", help="HHMMSS (по умолчанию 162000)")
-    args = parser.parse_args()
+import metrics
+from bulletin_cache import BulletinCache
+from cli import loader_arguments, parse_loader_arguments
+from daemon import Daemon, PollSchedule
+from database import SessionLocal
+from stamps import StampRegistry
+from trading_calendar import TradingCalendar
+from downloader import iter_daily_files, state_path
+from journal import IngestJournal
+from loader import Loader, init_db, migrate_names, upsert_results  # noqa: F401 — init_db/upsert_results раньше жили здесь
+from parser import to_rows
+from archive import iter_archive
+from pipeline import parse_day, run_pipeline
 
-    since = dt.datetime.strptime(args.since, "%Y-%m-%d").date()
-    until = dt.datetime.strptime(args.until, "%Y-%m-%d").date() if args.until else dt.date.today()
 
-    if since >= until:
-        raise SystemExit("since должно быть раньше until")
 
-    init_db()
+def main():
+    parser = argparse.ArgumentParser(description="SPIMEX oil bulletin loader", parents=[loader_arguments()])
+    parser.add_argument("--no-calendar", action="store_true", help="Не использовать торговый календарь: запрашивать каждый день подряд")
+    # Отдельного асинхронного режима нет: HTTP-клиент синхронный (requests), а Loader пишет
+    # по порядку дат через одно соединение — цикл событий дал бы тот же --pipeline
+    parser.add_argument("--pipeline", action="store_true", help="Конвейер: скачивание, разбор в пуле процессов и запись в БД параллельно")
+    parser.add_argument("--parse-procs", type=int, default=None, help="Число процессов для разбора в режиме --pipeline (по умолчанию — по числу ядер)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Размер очередей между стадиями конвейера (по умолчанию 8)")
+    parser.add_argument("--archive", metavar="DIR", help="Сохранять разобранные дни в Parquet-архив DIR (year=/month=/date=...parquet)")
+    parser.add_argument("--from-archive", metavar="DIR", help="Пересобрать БД из Parquet-архива DIR без сети и разбора .xls")
+    parser.add_argument("--daemon", action="store_true", help="Работать постоянно: ждать бюллетень текущего дня и загружать его сразу после публикации")
+    parser.add_argument("--publish-at", help="Ожидаемое время публикации HH:MM по Москве (по умолчанию — из первого --time)")
+    parser.add_argument("--poll-interval", type=float, default=15.0, help="Пауза между запросами около времени публикации, с (по умолчанию 15)")
+    parser.add_argument("--poll-max-interval", type=float, default=600.0, help="Предел паузы при опоздании файла, с (по умолчанию 600)")
+    parser.add_argument("--catch-up-days", type=int, default=7, help="Сколько последних дней догрузить при старте --daemon (по умолчанию 7)")
+    parser.add_argument("--metrics-jsonl", metavar="PATH", help="Писать замеры стадий (время, байты, строки, попадания в кэш) строками JSON в PATH")
+    parser.add_argument("--metrics-prom", metavar="PATH", help="Обновлять PATH в формате Prometheus textfile после каждой транзакции")
+    parser.add_argument("--migrate-names", action="store_true", help="Перенести названия старой схемы в справочники (необратимо: сначала резервная копия) и выйти")
+    args = parser.parse_args()
 
-    total_days = 0
-    total_files = 0
-    total_rows = 0
+    if args.migrate_names:
+        if migrate_names():
+            print("Названия перенесены в справочники exchange_product/delivery_basis (место вернёт VACUUM FULL)")
+        else:
+            print("Переносить нечего: схема уже со справочниками")
+        return
+
+    since, until, stamps = parse_loader_arguments(args)
+    if args.queue_size < 1:
+        raise SystemExit("queue-size должно быть >= 1")
+    if args.daemon:
+        # время публикации нужно только демону; обычному прогону stamp может быть любым HHMMSS
+        try:
+            publish_at = dt.datetime.strptime(args.publish_at or f"{stamps[0][:2]}:{stamps[0][2:4]}", "%H:%M").time()
+        except ValueError:
+            raise SystemExit("publish-at — HH:MM (или --time, первый stamp которого — время HHMM)")
+        if not 0 < args.poll_interval <= args.poll_max_interval:
+            raise SystemExit("нужно 0 < poll-interval <= poll-max-interval")
+
+    metrics.configure(args.metrics_jsonl, args.metrics_prom)
+    init_db(since, until)
+    if args.from_archive:
+        with SessionLocal() as session:
+            loader = Loader(
+                session, method=args.method, batch_days=args.batch_days,
+                aggregates=not args.no_aggregates, notify=not args.no_notify,
+            )
+            for day, path, df in iter_archive(args.from_archive, since, until):
+                with metrics.timer("to_rows"):
+                    rows = to_rows(df)
+                loader.write(day, path, rows)
+            loader.flush()
+        metrics.flush()
+        print(loader.summary())
+        return
+
+    cache = None if args.no_cache else BulletinCache(args.cache_dir)
+    calendar = None if args.no_calendar else TradingCalendar(
+        state_path("calendar.json", args.base_url), skip_weekends=not args.all_days,
+    )
 
-    with SessionLocal() as session:
-        for day, url, content in iter_daily_files(since, until, time_str=args.time):
-            total_days += 1
+    # журнал: продолжаем с того места, где остановился прошлый прогон
+    journal = IngestJournal(recheck=args.recheck, force=args.force)
+
+    if args.daemon:
+        schedule = PollSchedule(publish_at=publish_at, min_interval=args.poll_interval, max_interval=args.poll_max_interval)
+        with SessionLocal() as session:
+            loader = Loader(
+                session, method=args.method, aggregates=not args.no_aggregates,
+                journal=journal, notify=not args.no_notify,
+            )
+            daemon = Daemon(
+                loader, journal, stamps=stamps, base=args.base_url, schedule=schedule,
+                calendar=calendar, registry=StampRegistry(state_path("stamps.json", args.base_url)),
+                reader=args.reader,
+            )
             try:
-                df = parse_bulletin_xls(content, fallback_date=day)
-            except Exception as e:
-                print(f"[{day}] Пропуск из-за ошибки парсинга: {e}")
-                continue
-
-            records = to_records(df)
-            if not records:
-                print(f"[{day}] Нет строк с count>0 — пропускаю")
-                continue
-
-            upserted = upsert_results(session, records)
-            session.commit()
+                if args.catch_up_days > 0:
+                    daemon.catch_up(args.catch_up_days, cache=cache)
+                daemon.run()
+            except KeyboardInterrupt:
+                print("Остановлено")
+            finally:
+                metrics.flush()
+                print(loader.summary())
+        return
 
-            total_files += 1
-            total_rows  += len(records)
-            print(f"[{day}] OK: {len(records)} строк (upserted={upserted}) из {url}")
-
-    print(f"Готово. Дней просмотрено: {total_days}, файлов загружено: {total_files}, строк записано: {total_rows}")
+    with SessionLocal() as session:
+        journal.load(session, since, until)
+    skip = journal.settled_done()
+    if skip:
+        print(f"По журналу уже загружено дней: {len(skip)} — не запрашиваю")
+
+    files = journal.filter(iter_daily_files(
+        since, until, time_str=stamps[0], workers=args.workers,
+        base=args.base_url, cache=cache, calendar=calendar,
+        stamps=stamps, registry=StampRegistry(state_path("stamps.json", args.base_url)),
+        exclude=skip, retries=args.retries, on_failure=journal.failed,
+    ))
+
+    # closing: при ошибке записи генератор закроется сразу и успеет сохранить календарь
+    with closing(files), SessionLocal() as session:
+        loader = Loader(
+            session, method=args.method, batch_days=args.batch_days,
+            aggregates=not args.no_aggregates, journal=journal, notify=not args.no_notify,
+        )
+        if args.pipeline:
+            run_pipeline(
+                files, loader, procs=args.parse_procs, queue_size=args.queue_size,
+                reader=args.reader, archive=args.archive,
+            )
+        else:
+            for day, url, content in files:
+                try:
+                    rows = parse_day(day, content, reader=args.reader, archive=args.archive)
+                except Exception as e:
+                    loader.parse_failed(day, e, url)
+                    continue
+
+                loader.write(day, url, rows)
+        loader.flush()
+
+    metrics.flush()
+    print(loader.summary())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+
+# Границы корзин гистограмм задержек, секунды (как у клиентов Prometheus по умолчанию + длинный хвост)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+def _key(name: str, labels: Dict[str, Any]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """Выключенные метрики: все вызовы — пустые, стоимость — один вызов функции."""
+
+    enabled = False
+
+    def timer(self, name: str, **labels: Any) -> _NullTimer:
+        return _NULL_TIMER
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        pass
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        pass
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        return None
+
+    def merge(self, snap: Optional[Dict[str, Any]]) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "t0")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict[str, Any]) -> None:
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+class Metrics:
+    """
+    Счётчики и гистограммы задержек по стадиям загрузки.
+
+    jsonl_path — каждое наблюдение пишется строкой JSON (ts, metric, labels, value);
+    prom_path — при flush() пишется снимок в формате Prometheus textfile
+    (для node_exporter --collector.textfile).
+    """
+
+    enabled = True
+
+    def __init__(self, jsonl_path: Optional[str] = None, prom_path: Optional[str] = None, prefix: str = "spimex_") -> None:
+        self.prefix = prefix
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, float] = {}
+        # ключ -> [счётчики по корзинам..., +Inf], сумма, число наблюдений
+        self._hist: Dict[_Key, Tuple[List[int], List[float]]] = {}
+        self._events: Optional[List[Dict[str, Any]]] = None
+        self._jsonl = open(jsonl_path, "a", encoding="utf-8") if jsonl_path else None
+
+    # ---------- запись ----------
+
+    def timer(self, name: str, **labels: Any) -> _Timer:
+        return _Timer(self, name, labels)
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            counts, acc = self._hist.setdefault(key, ([0] * (len(BUCKETS) + 1), [0.0, 0]))
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            acc[0] += value
+            acc[1] += 1
+            self._emit("histogram", name, labels, value)
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._emit("counter", name, labels, value)
+
+    def _emit(self, kind: str, name: str, labels: Dict[str, Any], value: float) -> None:
+        event = {"ts": round(time.time(), 6), "type": kind, "metric": name, "labels": labels, "value": value}
+        if self._events is not None:
+            self._events.append(event)
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+
+    # ---------- перенос из дочерних процессов ----------
+
+    def collect_events(self) -> None:
+        """Копить наблюдения в памяти (в дочернем процессе), чтобы отдать их через snapshot()."""
+        self._events = []
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            events = self._events or []
+            if self._events is not None:
+                self._events = []
+        return {"events": events}
+
+    def merge(self, snap: Optional[Dict[str, Any]]) -> None:
+        """Повторяет наблюдения, сделанные в другом процессе."""
+        if not snap:
+            return
+        for ev in snap.get("events", []):
+            if ev["type"] == "histogram":
+                self.observe(ev["metric"], ev["value"], **ev["labels"])
+            else:
+                self.inc(ev["metric"], ev["value"], **ev["labels"])
+
+    # ---------- вывод ----------
+
+    def render_prometheus(self) -> str:
+        def fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            body = ",".join(f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+            return "{" + body + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = f"{self.prefix}{name}_total"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{fmt_labels(labels)} {value:g}")
+            for (name, labels), (counts, acc) in sorted(self._hist.items()):
+                metric = f"{self.prefix}{name}_seconds"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, cnt in zip(BUCKETS, counts):
+                    cumulative += cnt
+                    lines.append(f"{metric}_bucket{fmt_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                cumulative += counts[-1]
+                lines.append(f"{metric}_bucket{fmt_labels(labels, (('le', '+Inf'),))} {cumulative}")
+                lines.append(f"{metric}_sum{fmt_labels(labels)} {acc[0]:.6f}")
+                lines.append(f"{metric}_count{fmt_labels(labels)} {acc[1]}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> None:
+        if self._jsonl is not None:
+            self._jsonl.flush()
+        if self.prom_path:
+            tmp = f"{self.prom_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp, self.prom_path)
+
+
+# Текущий реестр; по умолчанию выключен
+current: Any = NullMetrics()
+
+def configure(jsonl_path: Optional[str] = None, prom_path: Optional[str] = None) -> None:
+    """Включает метрики, если задан хотя бы один вывод."""
+    global current
+    current = Metrics(jsonl_path, prom_path) if (jsonl_path or prom_path) else NullMetrics()
+
+def enable_collection() -> None:
+    """В дочернем процессе: копить наблюдения для передачи родителю."""
+    global current
+    current = Metrics()
+    current.collect_events()
+
+def timer(name: str, **labels: Any):
+    return current.timer(name, **labels)
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    current.observe(name, value, **labels)
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    current.inc(name, value, **labels)
+
+def flush() -> None:
+    current.flush()
@@ -1,24 +1,54 @@
 from __future__ import annotations
 
-from sqlalchemy import String, Integer, Numeric, Date, DateTime, func, UniqueConstraint
+import datetime as dt
+from typing import Optional
+
+from sqlalchemy import String, Integer, Numeric, Date, DateTime, ForeignKey, Text, func, Index, UniqueConstraint, select
 from sqlalchemy.orm import Mapped, mapped_column
 
+from config import PARTITION_BY
 from database import Base
 
 
 
+# При секционировании ключ секции (date) обязан входить в первичный ключ
+PARTITIONED = PARTITION_BY in ("month", "year")
+
+
+# ---------- Справочники названий (в бюллетенях — несколько тысяч различных значений) ----------
+
+class ExchangeProduct(Base):
+    __tablename__ = "exchange_product"
+
+    id:   Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(512), nullable=False, unique=True)
+
+
+class DeliveryBasis(Base):
+    __tablename__ = "delivery_basis"
+
+    id:   Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(512), nullable=False, unique=True)
+
+
 class SpimexTradingResult(Base):
     __tablename__ = "spimex_trading_results"
     __table_args__ = (
         UniqueConstraint("exchange_product_id", "date", name="uq_spimex_result_pid_date"),
+        # выборки «период + oil_id/delivery_basis_id/delivery_type_id»
+        Index("ix_spimex_oil_basis_type_date", "oil_id", "delivery_basis_id", "delivery_type_id", "date"),
+        # компактный индекс для диапазонов дат (данные ложатся по порядку дат)
+        Index("ix_spimex_date_brin", "date", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (date)"} if PARTITIONED else {},
     )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
     # поля из бюллетеня
     exchange_product_id:   Mapped[str]  = mapped_column(String(32),  nullable=False, index=True)
-    exchange_product_name: Mapped[str]  = mapped_column(String(512), nullable=False)
-    delivery_basis_name:   Mapped[str]  = mapped_column(String(512), nullable=False)
+    # названия — ссылками на справочники (прежние колонки — во view spimex_trading_results_wide)
+    exchange_product_name_id: Mapped[int] = mapped_column(ForeignKey("exchange_product.id"), nullable=False)
+    delivery_basis_name_id:   Mapped[int] = mapped_column(ForeignKey("delivery_basis.id"),   nullable=False)
 
     # производные поля из exchange_product_id
     oil_id:            Mapped[str] = mapped_column(String(4), nullable=False)   # [:4]
@@ -31,8 +61,93 @@ class SpimexTradingResult(Base):
     count:  Mapped[int]   = mapped_column(Integer,        nullable=False)  # кол-во договоров
 
     # дата торгов (из файла/URL)
-    date:   Mapped["date"] = mapped_column(Date, nullable=False)
+    date:   Mapped["date"] = mapped_column(Date, nullable=False, primary_key=PARTITIONED)
 
     # сервисные
     created_on: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_on: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+def trading_results_wide(service_columns: bool = True):
+    """SELECT результатов в прежней «широкой» форме: названия подставлены из справочников."""
+    T = SpimexTradingResult
+    columns = [
+        T.id,
+        T.exchange_product_id,
+        ExchangeProduct.name.label("exchange_product_name"),
+        DeliveryBasis.name.label("delivery_basis_name"),
+        T.oil_id,
+        T.delivery_basis_id,
+        T.delivery_type_id,
+        T.volume,
+        T.total,
+        T.count,
+        T.date,
+    ]
+    if service_columns:
+        columns += [T.created_on, T.updated_on]
+    return (
+        select(*columns)
+        .join(ExchangeProduct, ExchangeProduct.id == T.exchange_product_name_id)
+        .join(DeliveryBasis, DeliveryBasis.id == T.delivery_basis_name_id)
+    )
+
+
+# ---------- Агрегаты для дашбордов (обновляются загрузчиком по затронутым датам) ----------
+
+class SpimexDailyDynamics(Base):
+    __tablename__ = "spimex_daily_dynamics"
+
+    date:              Mapped[dt.date] = mapped_column(Date,      primary_key=True)
+    oil_id:            Mapped[str]     = mapped_column(String(4), primary_key=True)
+    delivery_basis_id: Mapped[str]     = mapped_column(String(3), primary_key=True)
+    delivery_type_id:  Mapped[str]     = mapped_column(String(1), primary_key=True)
+
+    volume:  Mapped[float] = mapped_column(Numeric(24, 6), nullable=False)
+    total:   Mapped[float] = mapped_column(Numeric(24, 2), nullable=False)
+    count:   Mapped[int]   = mapped_column(Integer,        nullable=False)  # сумма договоров
+    results: Mapped[int]   = mapped_column(Integer,        nullable=False)  # число строк-инструментов
+
+
+class SpimexMonthlyDynamics(Base):
+    __tablename__ = "spimex_monthly_dynamics"
+
+    month:             Mapped[dt.date] = mapped_column(Date,      primary_key=True)  # первое число месяца
+    oil_id:            Mapped[str]     = mapped_column(String(4), primary_key=True)
+    delivery_basis_id: Mapped[str]     = mapped_column(String(3), primary_key=True)
+    delivery_type_id:  Mapped[str]     = mapped_column(String(1), primary_key=True)
+
+    volume:       Mapped[float] = mapped_column(Numeric(24, 6), nullable=False)
+    total:        Mapped[float] = mapped_column(Numeric(24, 2), nullable=False)
+    count:        Mapped[int]   = mapped_column(Integer,        nullable=False)
+    results:      Mapped[int]   = mapped_column(Integer,        nullable=False)
+    trading_days: Mapped[int]   = mapped_column(Integer,        nullable=False)
+
+
+# ---------- Журнал загрузки: что и когда загружено по каждому дню ----------
+
+class SpimexIngestJournal(Base):
+    __tablename__ = "spimex_ingest_journal"
+
+    date:        Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    status:      Mapped[str]     = mapped_column(String(16), nullable=False)   # done / empty / missing / failed
+    url:         Mapped[Optional[str]] = mapped_column(String(512))
+    sha256:      Mapped[Optional[str]] = mapped_column(String(64))             # хэш загруженного файла
+    rows:        Mapped[int]     = mapped_column(Integer, nullable=False, default=0)
+    attempts:    Mapped[int]     = mapped_column(Integer, nullable=False, default=0)
+    last_error:  Mapped[Optional[str]] = mapped_column(Text)
+    started_on:  Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True))  # файл скачан
+    finished_on: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True))  # транзакция записана
+
+
+# ---------- Очередь дней для worker.py: кто и что уже обработал в прогоне ----------
+
+class SpimexIngestQueue(Base):
+    __tablename__ = "spimex_ingest_queue"
+
+    run_id:      Mapped[str]     = mapped_column(String(64), primary_key=True)   # общий у воркеров одного прогона
+    date:        Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    status:      Mapped[str]     = mapped_column(String(16), nullable=False, default="pending")  # pending / done / retry
+    owner:       Mapped[Optional[str]] = mapped_column(String(128))            # host:pid обработавшего воркера
+    created_on:  Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    finished_on: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+
+
+
+# Канал уведомлений о загруженных днях
+CHANNEL = "spimex_day_loaded"
+
+# Полезная нагрузка NOTIFY ограничена 8000 байтами — оставляем запас
+MAX_PAYLOAD = 7900
+
+@dataclass
+class DayLoaded:
+    date: dt.date
+    rows: int
+    inserted: int = 0
+    updated: int = 0
+    oil_ids: List[str] = field(default_factory=list)
+    truncated: bool = False  # oil_ids не поместились целиком
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["date"] = self.date.isoformat()
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, payload: str) -> "DayLoaded":
+        data = json.loads(payload)
+        data["date"] = dt.date.fromisoformat(data["date"])
+        return cls(**data)
+
+def encode_payload(event: DayLoaded) -> str:
+    """JSON события; если не влезает в лимит NOTIFY — список oil_ids укорачивается."""
+    payload = event.to_json()
+    if len(payload.encode("utf-8")) <= MAX_PAYLOAD:
+        return payload
+    ids = list(event.oil_ids)
+    event = DayLoaded(event.date, event.rows, event.inserted, event.updated, [], True)
+    budget = MAX_PAYLOAD - len(event.to_json().encode("utf-8"))
+    keep = []
+    for oil_id in ids:
+        budget -= len(json.dumps(oil_id, ensure_ascii=False).encode("utf-8")) + 1
+        if budget < 0:
+            break
+        keep.append(oil_id)
+    event.oil_ids = keep
+    return event.to_json()
+
+def publish(session: Session, event: DayLoaded, channel: str = CHANNEL) -> None:
+    """
+    NOTIFY в транзакции вызывающего: подписчики получат событие только после
+    коммита (и не получат при откате).
+    """
+    session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": encode_payload(event)})
+
+def events_for_batch(batch: Iterable[tuple[dt.date, int, Iterable[str]]], by_day) -> List[DayLoaded]:
+    """
+    События по дням пакета (день, число строк, oil_id строк): только дни,
+    где что-то вставлено или обновлено.
+    """
+    events = []
+    for day, rows, oil_ids in batch:
+        stats = by_day.get(day)
+        if stats is None or not (stats.inserted or stats.updated):
+            continue
+        events.append(DayLoaded(day, rows, stats.inserted, stats.updated, sorted({o for o in oil_ids if o})))
+    return events
+
+# ---------- ПОДПИСКА ----------
+
+def _connect(autocommit: bool = True):
+    import psycopg
+
+    return psycopg.connect(
+        host=DB_HOST, port=DB_PORT or None, dbname=DB_NAME, user=DB_USER, password=DB_PASS,
+        autocommit=autocommit,
+    )
+
+def listen(channel: str = CHANNEL, timeout: Optional[float] = None) -> Iterator[DayLoaded]:
+    """
+    События о загруженных днях по мере коммитов загрузчика (отдельное соединение
+    вне пула). timeout — сколько секунд слушать; None — без ограничения.
+    """
+    from psycopg import sql
+
+    with _connect() as conn:
+        conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        for note in conn.notifies(timeout=timeout):
+            yield DayLoaded.from_json(note.payload)
+
+def subscribe(
+    callback: Callable[[DayLoaded], None],
+    channel: str = CHANNEL,
+    invalidate_cache: bool = True,
+    reconnect_delay: float = 5.0,
+) -> None:
+    """
+    Бесконечный цикл подписки: на каждое событие сбрасывает кэш запросов
+    (queries.invalidate, если invalidate_cache) и вызывает callback.
+    При обрыве соединения переподключается; события за время обрыва могли
+    потеряться, поэтому после переподключения кэш тоже сбрасывается.
+    """
+    import psycopg
+
+    import queries
+
+    while True:
+        try:
+            for event in listen(channel):
+                if invalidate_cache:
+                    queries.invalidate()
+                callback(event)
+        except psycopg.OperationalError as e:
+            print(f"Соединение для LISTEN потеряно: {e}; переподключение через {reconnect_delay} с")
+            time.sleep(reconnect_delay)
+            if invalidate_cache:
+                queries.invalidate()
+
+def main():
+    parser = argparse.ArgumentParser(description="Печать событий о загруженных днях SPIMEX (LISTEN)")
+    parser.add_argument("--channel", default=CHANNEL, help=f"Канал NOTIFY (по умолчанию {CHANNEL})")
+    args = parser.parse_args()
+    for event in listen(args.channel):
+        print(event.to_json(), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import io
+import math
 import re
 import datetime as dt
 from typing import Any, Dict, List, Optional
 
+import numpy as np
 import pandas as pd
+import xlrd
 
 # --- Канон: как мы называем нужные поля в итоговом DataFrame ---
 CANON = {
@@ -54,6 +57,26 @@ def _norm_headers(df: pd.DataFrame) -> pd.DataFrame:
     out.columns = cols
     return out
 
+def _norm_lower_matrix(raw: pd.DataFrame) -> np.ndarray:
+    """_norm_lower для всех ячеек листа разом: строковые операции pandas вместо цикла по ячейкам."""
+    vals = raw.to_numpy(dtype=object).ravel()
+    text = pd.Series(vals, dtype=object).astype(str)
+    # str(x or ""): ложные значения (None, 0, False, "") дают пустую строку, NaN — "nan"
+    falsy = (vals == None) | (vals == 0) | (vals == "")  # noqa: E711 — поэлементное сравнение
+    text[falsy] = ""
+    text = (
+        text.str.replace("\xa0", " ", regex=False)
+            .str.replace(r"\s+", " ", regex=True)
+            .str.strip()
+            .str.lower()
+    )
+    return text.to_numpy(dtype=object).reshape(raw.shape)
+
+def _contains(arr: np.ndarray, needle: str) -> np.ndarray:
+    """Поэлементная проверка вхождения подстроки для массива строк любой формы."""
+    flat = pd.Series(arr.ravel(), dtype=object).str.contains(needle, regex=False)
+    return flat.to_numpy(dtype=bool).reshape(arr.shape)
+
 def _row_has_header_keywords(row_vals: List[str]) -> bool:
     row_l = [_norm_lower(v) for v in row_vals]
     return any("код инструмента" in v for v in row_l)
@@ -90,7 +113,7 @@ def parse_bulletin_xls(content: bytes, fallback_date: Optional[dt.date] = None)
     # 1) Дата торгов из верхних строк (если есть)
     bulletin_date: Optional[dt.date] = None
     for sh in sheets.values():
-        blob = " ".join(sh.astype(str).head(30).values.ravel())
+        blob = " ".join(sh.head(30).astype(str).values.ravel())
         m = DATE_RE.search(blob)
         if m:
             bulletin_date = dt.datetime.strptime(m.group(1), "%d.%m.%Y").date()
@@ -105,92 +128,99 @@ def parse_bulletin_xls(content: bytes, fallback_date: Optional[dt.date] = None)
             continue
 
         n_rows, n_cols = raw.shape[0], raw.shape[1]
+        # Нормализованный текст всех ячеек листа — один проход, дальше только маски
+        lower = _norm_lower_matrix(raw)
+
         # В колонке C (индекс 2) ищем маркеры «Единица измерения: Метрическая тонна»
         col_c = raw.iloc[:, 2] if n_cols > 2 else pd.Series([], dtype=object)
-        marker_rows = col_c[col_c.astype(str).str.contains(TON_MARKER, case=False, regex=False, na=False)].index.tolist()
+        marker_rows = np.flatnonzero(col_c.astype(str).str.contains(TON_MARKER, case=False, regex=False, na=False).to_numpy())
 
         # На некоторых файлах маркер может быть не в C (слияния ячеек/экспорт).
         # Сделаем мягкий fallback: если в C не нашли — ищем по всей строке.
-        if not marker_rows:
-            mask_any = raw.apply(
-                lambda r: any(TON_MARKER.lower() in _norm_lower(x) for x in r),
-                axis=1
-            )
-            marker_rows = raw.index[mask_any].tolist()
+        if not len(marker_rows):
+            marker_rows = np.flatnonzero(_contains(lower, TON_MARKER.lower()).any(axis=1))
+        if not len(marker_rows):
+            continue
+
+        # Строки-шапки: где есть «Код Инструмента»
+        header_rows = np.flatnonzero(_contains(lower, "код инструмента").any(axis=1))
+
+        # Кандидаты на конец таблицы: следующий маркер/секция/пустая C
+        # или три подряд полностью пустые строки
+        if n_cols > 2:
+            c = lower[:, 2]
+            stop = _contains(c, "единица измерения") | _contains(c, "секция биржи") | (c == "")
+        else:
+            stop = np.ones(n_rows, dtype=bool)
+        empty = raw.isna().all(axis=1).to_numpy()
+        if n_rows > 2:
+            stop[: n_rows - 2] |= empty[:-2] & empty[1:-1] & empty[2:]
+        stop_rows = np.flatnonzero(stop)
 
         for r in marker_rows:
-            # 2) Найти строку-шапку: ближайшая ниже строка, где есть «Код Инструмента»
-            header_row = None
-            headers: List[str] = []
-            for i in range(r + 1, min(r + 30, n_rows)):  # окно поиска шапки
-                row_vals = [_norm_text(x) for x in raw.iloc[i].tolist()]
-                if _row_has_header_keywords(row_vals):
-                    header_row = i
-                    headers = row_vals
-                    break
-            if header_row is None:
+            # 2) Найти строку-шапку: ближайшая ниже строка в окне 30 строк
+            k = np.searchsorted(header_rows, r, side="right")
+            if k == len(header_rows) or header_rows[k] >= min(r + 30, n_rows):
                 continue  # не нашли шапку — пропускаем этот маркер
+            header_row = int(header_rows[k])
+            headers = [_norm_text(x) for x in raw.iloc[header_row].tolist()]
 
-            # 3) Конец таблицы: до следующего маркера/секции/полностью пустой полосы
-            end_row = None
-            for j in range(header_row + 1, n_rows):
-                val_c = raw.iat[j, 2] if n_cols > 2 else ""
-                if _is_next_section_marker(val_c):
-                    end_row = j
-                    break
-                # стоп-условие: три подряд полностью пустые строки
-                if j + 2 < n_rows:
-                    if all(raw.iloc[k].isna().all() for k in (j, j+1, j+2)):
-                        end_row = j
-                        break
-            if end_row is None:
-                end_row = n_rows
+            # 3) Конец таблицы: первая стоп-строка после шапки
+            k = np.searchsorted(stop_rows, header_row, side="right")
+            end_row = int(stop_rows[k]) if k < len(stop_rows) else n_rows
 
             # 4) Собираем блок и нормализуем заголовки
-            block = raw.iloc[header_row + 1 : end_row].copy()
-            block.columns = headers
-            block = _norm_headers(block)
-            block = block.dropna(how="all").dropna(axis=1, how="all")
-
-            # 5) Оставляем только интересующие столбцы
-            need_ru = [
-                CANON["exchange_product_id"],
-                CANON["exchange_product_name"],
-                CANON["delivery_basis_name"],
-                CANON["volume"],
-                CANON["total"],
-                CANON["count"],
-            ]
-            has = [c for c in need_ru if c in block.columns]
-            if len(has) < 5:
-                continue
-
-            df = block[has].copy()
-
-            # 6) Приведение чисел
-            if CANON["volume"] in df.columns:
-                df[CANON["volume"]] = _clean_numbers(df[CANON["volume"]])
-            if CANON["total"] in df.columns:
-                df[CANON["total"]]  = _clean_numbers(df[CANON["total"]])
-            if CANON["count"] in df.columns:
-                df[CANON["count"]]  = _clean_numbers(df[CANON["count"]])
-
-            # 7) Фильтр: Количество договоров > 0
-            if CANON["count"] in df.columns:
-                df = df[df[CANON["count"]].fillna(0) > 0]
-
-            # 8) Переименуем в канон-ключи и добавим дату
-            rename = {v: k for k, v in CANON.items() if v in df.columns}
-            df = df.rename(columns=rename)
-            df["date"] = bulletin_date
-
-            # 9) Очистим мусор: пустые коды
-            df = df[df["exchange_product_id"].notna()]
-            df["exchange_product_id"] = df["exchange_product_id"].astype(str).str.strip()
-
-            if not df.empty:
+            df = _extract_block(raw.iloc[header_row + 1 : end_row].copy(), headers, bulletin_date)
+            if df is not None:
                 blocks.append(df)
 
+    return _concat_blocks(blocks)
+
+def _extract_block(block: pd.DataFrame, headers: List[str], bulletin_date: dt.date) -> Optional[pd.DataFrame]:
+    """Шаги 4–9: из сырых строк блока делаем таблицу в канон-колонках (или None)."""
+    block.columns = headers
+    block = _norm_headers(block)
+    block = block.dropna(how="all").dropna(axis=1, how="all")
+
+    # 5) Оставляем только интересующие столбцы
+    need_ru = [
+        CANON["exchange_product_id"],
+        CANON["exchange_product_name"],
+        CANON["delivery_basis_name"],
+        CANON["volume"],
+        CANON["total"],
+        CANON["count"],
+    ]
+    has = [c for c in need_ru if c in block.columns]
+    if len(has) < 5:
+        return None
+
+    df = block[has].copy()
+
+    # 6) Приведение чисел
+    if CANON["volume"] in df.columns:
+        df[CANON["volume"]] = _clean_numbers(df[CANON["volume"]])
+    if CANON["total"] in df.columns:
+        df[CANON["total"]]  = _clean_numbers(df[CANON["total"]])
+    if CANON["count"] in df.columns:
+        df[CANON["count"]]  = _clean_numbers(df[CANON["count"]])
+
+    # 7) Фильтр: Количество договоров > 0
+    if CANON["count"] in df.columns:
+        df = df[df[CANON["count"]].fillna(0) > 0]
+
+    # 8) Переименуем в канон-ключи и добавим дату
+    rename = {v: k for k, v in CANON.items() if v in df.columns}
+    df = df.rename(columns=rename)
+    df["date"] = bulletin_date
+
+    # 9) Очистим мусор: пустые коды
+    df = df[df["exchange_product_id"].notna()]
+    df["exchange_product_id"] = df["exchange_product_id"].astype(str).str.strip()
+
+    return None if df.empty else df
+
+def _concat_blocks(blocks: List[pd.DataFrame]) -> pd.DataFrame:
     if not blocks:
         raise ValueError("Не удалось извлечь таблицу «Единица измерения: Метрическая тонна» (или нет строк с count>0).")
 
@@ -203,6 +233,141 @@ def parse_bulletin_xls(content: bytes, fallback_date: Optional[dt.date] = None)
 
     return out.reset_index(drop=True)
 
+# ---------- ЛЁГКИЙ ЧИТАТЕЛЬ НА xlrd ----------
+
+# Строки, которые pandas.read_excel превращает в NaN (значения по умолчанию na_values)
+_NA_STRINGS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+
+def _xlrd_cell(value: Any, typ: int, datemode: int) -> Any:
+    """Значение ячейки так же, как его отдаёт pandas.read_excel(engine="xlrd")."""
+    if typ in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return np.nan
+    if typ == xlrd.XL_CELL_TEXT:
+        return np.nan if value in _NA_STRINGS else value
+    if typ == xlrd.XL_CELL_NUMBER:
+        if math.isfinite(value) and int(value) == value:
+            return int(value)
+        return value
+    if typ == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    if typ == xlrd.XL_CELL_DATE:
+        try:
+            value = xlrd.xldate.xldate_as_datetime(value, datemode)
+        except OverflowError:
+            return value
+        if (not datemode and value.timetuple()[:3] == (1899, 12, 31)) or (datemode and value.timetuple()[:3] == (1904, 1, 1)):
+            return dt.time(value.hour, value.minute, value.second, value.microsecond)
+    return value
+
+def _is_na(x: Any) -> bool:
+    return isinstance(x, float) and math.isnan(x)
+
+def parse_bulletin_xls_xlrd(content: bytes, fallback_date: Optional[dt.date] = None) -> pd.DataFrame:
+    """
+    То же, что parse_bulletin_xls, но без pandas.read_excel: листы открываются
+    через xlrd по требованию, сначала просматривается только колонка C, а в
+    DataFrame превращаются лишь строки найденных блоков. Результат совпадает.
+    """
+    book = xlrd.open_workbook(file_contents=content, on_demand=True)
+    try:
+        datemode = book.datemode
+
+        def row(sheet, i: int) -> List[Any]:
+            return [_xlrd_cell(v, t, datemode) for v, t in zip(sheet.row_values(i), sheet.row_types(i))]
+
+        # 1) Дата торгов из верхних строк (если есть)
+        bulletin_date: Optional[dt.date] = None
+        for idx in range(book.nsheets):
+            sheet = book.sheet_by_index(idx)
+            for i in range(min(30, sheet.nrows)):
+                for v in row(sheet, i):
+                    if _is_na(v):
+                        continue
+                    m = DATE_RE.search(str(v))
+                    if m:
+                        bulletin_date = dt.datetime.strptime(m.group(1), "%d.%m.%Y").date()
+                        break
+                if bulletin_date is not None:
+                    break
+            if bulletin_date is not None:
+                break
+        if bulletin_date is None:
+            bulletin_date = fallback_date or dt.date.today()
+
+        blocks: List[pd.DataFrame] = []
+        marker_u = TON_MARKER.upper()
+        marker_l = TON_MARKER.lower()
+
+        for idx in range(book.nsheets):
+            sheet = book.sheet_by_index(idx)
+            n_rows, n_cols = sheet.nrows, sheet.ncols
+            if n_rows == 0 or n_cols == 0:
+                book.unload_sheet(idx)
+                continue
+
+            # Колонка C целиком — одна дешёвая выборка
+            col_c: List[Any] = []
+            if n_cols > 2:
+                col_c = [_xlrd_cell(v, t, datemode) for v, t in zip(sheet.col_values(2), sheet.col_types(2))]
+            marker_rows = [i for i, v in enumerate(col_c) if marker_u in str(v).upper()]
+            if not marker_rows:
+                marker_rows = [
+                    i for i in range(n_rows)
+                    if any(marker_l in _norm_lower(x) for x in row(sheet, i))
+                ]
+
+            empty_cache: Dict[int, bool] = {}
+
+            def is_empty(i: int) -> bool:
+                if i not in empty_cache:
+                    empty_cache[i] = all(_is_na(x) for x in row(sheet, i))
+                return empty_cache[i]
+
+            for r in marker_rows:
+                header_row = None
+                headers: List[str] = []
+                for i in range(r + 1, min(r + 30, n_rows)):
+                    row_vals = [_norm_text(x) for x in row(sheet, i)]
+                    if _row_has_header_keywords(row_vals):
+                        header_row = i
+                        headers = row_vals
+                        break
+                if header_row is None:
+                    continue
+
+                end_row = None
+                for j in range(header_row + 1, n_rows):
+                    val_c = col_c[j] if n_cols > 2 else ""
+                    if _is_next_section_marker(val_c):
+                        end_row = j
+                        break
+                    if j + 2 < n_rows and is_empty(j) and is_empty(j + 1) and is_empty(j + 2):
+                        end_row = j
+                        break
+                if end_row is None:
+                    end_row = n_rows
+
+                rows = [row(sheet, i) for i in range(header_row + 1, end_row)]
+                block = pd.DataFrame(rows, columns=range(n_cols), dtype=object)
+                df = _extract_block(block, headers, bulletin_date)
+                if df is not None:
+                    blocks.append(df)
+
+            book.unload_sheet(idx)
+    finally:
+        book.release_resources()
+
+    return _concat_blocks(blocks)
+
+# Доступные реализации разбора бюллетеня (ключ — значение опции --reader)
+READERS = {
+    "pandas": parse_bulletin_xls,
+    "xlrd":   parse_bulletin_xls_xlrd,
+}
+
 # ---------- УТИЛИТЫ ДЛЯ ЗАПИСИ В БД ----------
 
 def split_product_id(epid: str) -> Dict[str, str]:
@@ -214,21 +379,60 @@ def split_product_id(epid: str) -> Dict[str, str]:
         "delivery_type_id":  s[-1]  if s else "",
     }
 
+# Порядок полей записи для загрузчиков (to_rows/to_columns)
+RECORD_FIELDS = (
+    "exchange_product_id",
+    "exchange_product_name",
+    "delivery_basis_name",
+    "oil_id",
+    "delivery_basis_id",
+    "delivery_type_id",
+    "volume",
+    "total",
+    "count",
+    "date",
+)
+
+def to_columns(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    """
+    Колонки записей целиком, без обхода строк: производные id — срезами строк
+    (как в split_product_id), числа — одним приведением на колонку.
+    """
+    n = len(df)
+
+    def col(name: str) -> pd.Series:
+        if name in df.columns:
+            return df[name]
+        return pd.Series([None] * n, index=df.index, dtype=object)
+
+    epid = col("exchange_product_id").fillna("").astype(str)
+    volume = pd.to_numeric(col("volume"), errors="coerce").astype("float64")
+    total = pd.to_numeric(col("total"), errors="coerce").astype("float64")
+    count = pd.to_numeric(col("count"), errors="coerce").fillna(0).astype("int64")
+    # отсутствующее значение -> 0, как в to_records (NaN остаётся NaN)
+    if "volume" not in df.columns:
+        volume = volume.fillna(0.0)
+    if "total" not in df.columns:
+        total = total.fillna(0.0)
+
+    return {
+        "exchange_product_id":   col("exchange_product_id").tolist(),
+        "exchange_product_name": col("exchange_product_name").tolist(),
+        "delivery_basis_name":   col("delivery_basis_name").tolist(),
+        "oil_id":            epid.str[:4].tolist(),
+        "delivery_basis_id": epid.str[4:7].where(epid.str.len() >= 7, "").tolist(),
+        "delivery_type_id":  epid.str[-1:].tolist(),
+        "volume": volume.tolist(),
+        "total":  total.tolist(),
+        "count":  count.tolist(),
+        "date":   col("date").tolist(),
+    }
+
+def to_rows(df: pd.DataFrame) -> List[tuple]:
+    """Записи кортежами в порядке RECORD_FIELDS (удобно для COPY/executemany)."""
+    cols = to_columns(df)
+    return list(zip(*(cols[f] for f in RECORD_FIELDS)))
+
 def to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
     """Преобразуем DataFrame в список словарей для upsert-а в БД."""
-    rows: List[Dict[str, Any]] = []
-    for _, row in df.iterrows():
-        parts = split_product_id(row.get("exchange_product_id", ""))
-        rows.append({
-            "exchange_product_id":   row.get("exchange_product_id"),
-            "exchange_product_name": row.get("exchange_product_name"),
-            "delivery_basis_name":   row.get("delivery_basis_name"),
-            "oil_id":                parts["oil_id"],
-            "delivery_basis_id":     parts["delivery_basis_id"],
-            "delivery_type_id":      parts["delivery_type_id"],
-            "volume": float(row.get("volume") or 0.0),
-            "total":  float(row.get("total")  or 0.0),
-            "count":  int(row.get("count")   or 0),
-            "date":   row.get("date"),
-        })
-    return rows
+    return [dict(zip(RECORD_FIELDS, row)) for row in to_rows(df)]
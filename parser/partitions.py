@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from config import PARTITION_BY
+
+
+
+TABLE = "spimex_trading_results"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+def partition_bounds(day: dt.date, granularity: str) -> Tuple[dt.date, dt.date]:
+    """Границы [from, to) месячной или годовой секции, в которую попадает day."""
+    if granularity == "year":
+        return dt.date(day.year, 1, 1), dt.date(day.year + 1, 1, 1)
+    if granularity == "month":
+        start = day.replace(day=1)
+        end = dt.date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+        return start, end
+    raise ValueError(f"Неизвестная гранулярность секций: {granularity!r}")
+
+def partition_name(start: dt.date, granularity: str) -> str:
+    if granularity == "year":
+        return f"{TABLE}_y{start.year}"
+    return f"{TABLE}_y{start.year}m{start.month:02d}"
+
+def iter_partitions(start: dt.date, end_exclusive: dt.date, granularity: str) -> Iterator[Tuple[str, dt.date, dt.date]]:
+    cur = start
+    while cur < end_exclusive:
+        lo, hi = partition_bounds(cur, granularity)
+        yield partition_name(lo, granularity), lo, hi
+        cur = hi
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:t)"
+    ), {"t": TABLE}).scalar())
+
+def existing_partitions(conn: Connection) -> List[str]:
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t) ORDER BY c.relname"
+    ), {"t": TABLE}).scalars())
+
+def ensure_partitions(conn: Connection, start: dt.date, end_exclusive: dt.date, granularity: str = PARTITION_BY) -> List[str]:
+    """
+    Создаёт недостающие секции под период и DEFAULT-секцию для дат вне их.
+    Если в DEFAULT уже лежат строки нового диапазона, они переносятся в новую секцию.
+    Возвращает имена созданных секций.
+    """
+    if not is_partitioned(conn):
+        return []
+    have = set(existing_partitions(conn))
+    created: List[str] = []
+
+    if DEFAULT_PARTITION not in have:
+        conn.execute(text(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF {TABLE} DEFAULT'))
+        have.add(DEFAULT_PARTITION)
+        created.append(DEFAULT_PARTITION)
+
+    for name, lo, hi in iter_partitions(start, end_exclusive, granularity):
+        if name in have:
+            continue
+        stray = conn.execute(text(
+            f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE date >= :lo AND date < :hi LIMIT 1'
+        ), {"lo": lo, "hi": hi}).scalar()
+        if not stray:
+            conn.execute(text(
+                f'CREATE TABLE "{name}" PARTITION OF {TABLE} FOR VALUES FROM (\'{lo}\') TO (\'{hi}\')'
+            ))
+        else:
+            # строки диапазона уже в DEFAULT: переносим их и только потом подключаем секцию
+            conn.execute(text(f'CREATE TABLE "{name}" (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+            conn.execute(text(
+                f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE date >= :lo AND date < :hi RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved'
+            ), {"lo": lo, "hi": hi})
+            conn.execute(text(
+                f'ALTER TABLE {TABLE} ATTACH PARTITION "{name}" FOR VALUES FROM (\'{lo}\') TO (\'{hi}\')'
+            ))
+        created.append(name)
+    return created
+
+def detach_partitions_before(conn: Connection, before: dt.date, granularity: str = PARTITION_BY) -> List[str]:
+    """
+    Отсоединяет секции, целиком лежащие раньше before. Таблицы остаются
+    (их можно архивировать или удалить), из основной таблицы данные пропадают мгновенно.
+    """
+    detached: List[str] = []
+    for name in existing_partitions(conn):
+        if name == DEFAULT_PARTITION:
+            continue
+        bound = conn.execute(text(
+            "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_class c WHERE c.relname = :n"
+        ), {"n": name}).scalar() or ""
+        # FOR VALUES FROM ('2023-01-01') TO ('2023-02-01')
+        try:
+            hi = dt.date.fromisoformat(bound.rsplit("'", 2)[-2])
+        except (IndexError, ValueError):
+            continue
+        if hi <= before:
+            conn.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION "{name}"'))
+            detached.append(name)
+    return detached
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Секции spimex_trading_results по дате")
+    parser.add_argument("--ensure", nargs=2, metavar=("SINCE", "UNTIL"), help="Создать секции на период [SINCE, UNTIL)")
+    parser.add_argument("--detach-before", metavar="DATE", help="Отсоединить секции, целиком лежащие раньше DATE")
+    args = parser.parse_args()
+
+    if not PARTITION_BY:
+        raise SystemExit("Секционирование выключено: задайте SPIMEX_PARTITION_BY=month|year")
+
+    with engine.begin() as conn:
+        if args.ensure:
+            since, until = (dt.date.fromisoformat(x) for x in args.ensure)
+            for name in ensure_partitions(conn, since, until):
+                print(f"Создана секция: {name}")
+        if args.detach_before:
+            for name in detach_partitions_before(conn, dt.date.fromisoformat(args.detach_before)):
+                print(f"Отсоединена секция: {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import datetime as dt
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import metrics
+from archive import write_day
+from loader import Loader
+from parser import READERS, to_rows
+
+
+
+_DONE = object()
+
+def parse_day(day: dt.date, content: bytes, reader: str = "pandas", archive: Optional[str] = None) -> List[tuple]:
+    """
+    xls -> DataFrame -> строки-кортежи в порядке RECORD_FIELDS (в конвейере выполняется
+    в дочернем процессе); в таком виде они и идут в Loader.
+    archive — каталог Parquet-архива: туда же сохраняется разобранный DataFrame дня.
+    Ошибка архива не ошибка разбора: она логируется, а день всё равно загружается.
+    """
+    with metrics.timer("parse", reader=reader):
+        df = READERS[reader](content, fallback_date=day)
+    metrics.inc("rows", len(df), stage="parse")
+    with metrics.timer("to_rows"):
+        rows = to_rows(df)
+    metrics.inc("rows", len(rows), stage="to_rows")
+    if archive:
+        try:
+            with metrics.timer("archive"):
+                write_day(archive, day, df)
+        except Exception as e:
+            metrics.inc("archive_errors")
+            print(f"[{day}] Не удалось сохранить в архив {archive}: {type(e).__name__}: {e}")
+    return rows
+
+def _parse_collect(day: dt.date, content: bytes, reader: str, archive: Optional[str]) -> tuple[List[tuple], Optional[Dict[str, Any]]]:
+    # В дочернем процессе метрики копятся в памяти и возвращаются родителю вместе с записями
+    metrics.enable_collection()
+    return parse_day(day, content, reader, archive), metrics.current.snapshot()
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    # put с возможностью прерваться, если писатель упал
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def run_pipeline(
+    files: Iterable[tuple[dt.date, str, bytes]],
+    loader: Loader,
+    procs: Optional[int] = None,
+    queue_size: int = 8,
+    reader: str = "pandas",
+    archive: Optional[str] = None,
+) -> None:
+    """
+    Конвейер: скачивание (поток) -> разбор (пул процессов) -> запись (текущий поток).
+
+    Между стадиями — очереди на queue_size элементов: если БД или разбор не
+    успевают, скачивание приостанавливается. Дни пишутся в порядке дат,
+    ошибки разбора логируются и день пропускается, как в обычном режиме.
+    """
+    downloaded: queue.Queue = queue.Queue(maxsize=queue_size)
+    parsed: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    job = _parse_collect if metrics.current.enabled else parse_day
+
+    def download_stage() -> None:
+        try:
+            for item in files:
+                if not _put(downloaded, item, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            _put(downloaded, _DONE, stop)
+
+    def parse_stage(pool: ProcessPoolExecutor) -> None:
+        try:
+            while not stop.is_set():
+                try:
+                    item = downloaded.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                day, url, content = item
+                if not _put(parsed, (day, url, pool.submit(job, day, content, reader, archive)), stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            _put(parsed, _DONE, stop)
+
+    ctx = multiprocessing.get_context("spawn")  # fork при живых потоках небезопасен
+    with ProcessPoolExecutor(max_workers=procs, mp_context=ctx) as pool:
+        threads = [
+            threading.Thread(target=download_stage, name="spimex-download", daemon=True),
+            threading.Thread(target=parse_stage, args=(pool,), name="spimex-parse", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = parsed.get()
+                if item is _DONE:
+                    break
+                day, url, fut = item
+                try:
+                    rows = fut.result()
+                except Exception as e:
+                    loader.parse_failed(day, e, url)
+                    continue
+                if job is _parse_collect:
+                    rows, snap = rows
+                    metrics.current.merge(snap)
+                loader.write(day, url, rows)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    if errors:
+        raise errors[0]
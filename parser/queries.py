@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import datetime as dt
+import functools
+import inspect
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+
+import aggregates
+from config import QUERY_CACHE_TTL, QUERY_CACHE_URL
+from database import SessionLocal
+from models import SpimexTradingResult, trading_results_wide
+from query_cache import make_cache
+
+
+
+# Кэш запросов чтения. В памяти процесса по умолчанию; с SPIMEX_QUERY_CACHE_URL=redis://…
+# общий для всех процессов. Загрузчик сбрасывает его после коммита нового дня (invalidate),
+# но без Redis это только его собственный кэш: читатели в других процессах должны
+# либо жить с TTL, либо слушать NOTIFY загрузчика — см. start_invalidation_listener.
+_cache = make_cache(QUERY_CACHE_URL, QUERY_CACHE_TTL)
+
+def set_cache(cache) -> None:
+    """Подменить бэкенд кэша (любой объект с get/set/clear)."""
+    global _cache
+    _cache = cache
+
+def invalidate() -> None:
+    _cache.clear()
+
+def start_invalidation_listener() -> threading.Thread:
+    """
+    Фоновый поток, сбрасывающий кэш этого процесса по NOTIFY загрузчика (notify.subscribe).
+    Нужен читателям в отдельных процессах при кэше в памяти; с Redis не обязателен.
+    """
+    import notify
+
+    thread = threading.Thread(
+        target=notify.subscribe, args=(lambda event: None,), name="spimex-cache-invalidation", daemon=True,
+    )
+    thread.start()
+    return thread
+
+def _cache_key(fn: Callable, signature: inspect.Signature, args: tuple, kwargs: dict) -> tuple:
+    # f(5), f(n=5) и f() с n=5 по умолчанию — одна запись кэша
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    items = []
+    for name, value in bound.arguments.items():
+        kind = signature.parameters[name].kind
+        if kind is inspect.Parameter.VAR_KEYWORD:
+            items += sorted(value.items())
+        elif kind is inspect.Parameter.VAR_POSITIONAL:
+            items.append((name, tuple(value)))
+        else:
+            items.append((name, value))
+    return (fn.__name__, tuple(items))
+
+def _copy_rows(value: Any) -> Any:
+    # список и строки-словари у каждого вызова свои; значения в строках (даты, Decimal, str) неизменяемые
+    if isinstance(value, list):
+        return [dict(r) if isinstance(r, dict) else r for r in value]
+    return value
+
+def _cached(fn: Callable) -> Callable:
+    """
+    Кэширует результат fn. Вызывающий получает копию: правка списка или строки
+    не попадёт ни в кэш, ни к другим читателям того же ключа.
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = _cache_key(fn, signature, args, kwargs)
+        hit, value = _cache.get(key)
+        if hit:
+            return _copy_rows(value)
+        value = fn(*args, **kwargs)
+        _cache.set(key, value)
+        return _copy_rows(value)
+    wrapper.uncached = fn
+    return wrapper
+
+def _filtered(stmt, oil_id, delivery_type_id, delivery_basis_id):
+    T = SpimexTradingResult
+    if oil_id is not None:
+        stmt = stmt.where(T.oil_id == oil_id)
+    if delivery_basis_id is not None:
+        stmt = stmt.where(T.delivery_basis_id == delivery_basis_id)
+    if delivery_type_id is not None:
+        stmt = stmt.where(T.delivery_type_id == delivery_type_id)
+    return stmt
+
+# ---------- ЗАПРОСЫ ----------
+
+@_cached
+def get_last_trading_dates(n: int) -> List[dt.date]:
+    """
+    Последние n дат торгов (по убыванию) — по самой таблице результатов: агрегаты
+    могут отставать (--no-aggregates, до rebuild).
+    """
+    T = SpimexTradingResult
+    with SessionLocal() as session:
+        return list(session.execute(
+            select(T.date).group_by(T.date).order_by(T.date.desc()).limit(n)
+        ).scalars())
+
+@_cached
+def get_dynamics(
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+) -> List[Dict[str, Any]]:
+    """Результаты торгов за период [start, end] с фильтрами по измерениям."""
+    T = SpimexTradingResult
+    stmt = _filtered(trading_results_wide(service_columns=False), oil_id, delivery_type_id, delivery_basis_id)
+    if start is not None:
+        stmt = stmt.where(T.date >= start)
+    if end is not None:
+        stmt = stmt.where(T.date <= end)
+    stmt = stmt.order_by(T.date, T.exchange_product_id)
+    with SessionLocal() as session:
+        return [dict(r._mapping) for r in session.execute(stmt)]
+
+@_cached
+def get_trading_results(
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Результаты последнего торгового дня с фильтрами по измерениям."""
+    last = get_last_trading_dates(1)
+    if not last:
+        return []
+    T = SpimexTradingResult
+    stmt = _filtered(trading_results_wide(service_columns=False), oil_id, delivery_type_id, delivery_basis_id)
+    stmt = stmt.where(T.date == last[0]).order_by(T.exchange_product_id)
+    with SessionLocal() as session:
+        return [dict(r._mapping) for r in session.execute(stmt)]
+
+@_cached
+def get_daily_dynamics(start: dt.date, end: dt.date, **filters: Optional[str]) -> List[Dict[str, Any]]:
+    """Дневные агрегаты (см. aggregates.get_daily_dynamics) через кэш."""
+    with SessionLocal() as session:
+        return aggregates.get_daily_dynamics(session, start, end, **filters)
+
+@_cached
+def get_monthly_dynamics(start: dt.date, end: dt.date, **filters: Optional[str]) -> List[Dict[str, Any]]:
+    """Месячные агрегаты (см. aggregates.get_monthly_dynamics) через кэш."""
+    with SessionLocal() as session:
+        return aggregates.get_monthly_dynamics(session, start, end, **filters)
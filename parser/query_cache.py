@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+
+class TTLCache:
+    """Кэш в памяти процесса: LRU на maxsize записей, каждая живёт ttl секунд."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """(найдено, значение) — None тоже допустимое значение."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """
+    Тот же интерфейс поверх Redis (или совместимого сервера): кэш общий для
+    всех процессов, очистка видна всем читателям сразу. Нужен пакет redis.
+    """
+
+    def __init__(self, url: str, ttl: float = 600, prefix: str = "spimex:q:") -> None:
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Для RedisCache нужен пакет redis (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key: Hashable) -> str:
+        return self.prefix + repr(key)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.client.set(self._key(key), pickle.dumps(value), ex=max(int(self.ttl), 1))
+
+    def clear(self) -> None:
+        batch = []
+        for k in self.client.scan_iter(match=self.prefix + "*", count=500):
+            batch.append(k)
+            if len(batch) >= 500:
+                self.client.unlink(*batch)
+                batch = []
+        if batch:
+            self.client.unlink(*batch)
+
+
+def make_cache(url: Optional[str] = None, ttl: float = 600):
+    """redis://…, rediss://…, unix://… — RedisCache; пусто — TTLCache в памяти."""
+    if url and url.split("://", 1)[0] in ("redis", "rediss", "unix"):
+        return RedisCache(url, ttl=ttl)
+    return TTLCache(ttl=ttl)
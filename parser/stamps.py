@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from typing import Dict, Optional
+
+from state_file import locked, read_json, write_json
+
+
+
+class StampRegistry:
+    """
+    Запомненные отметки времени публикации (HHMMSS) по дням.
+    Если день уже найден под каким-то stamp-ом, повторные запуски
+    идут сразу по нужному URL без перебора кандидатов.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._stamps: Dict[dt.date, str] = {}
+        # несохранённые изменения: день -> stamp (None — забыт)
+        self._changes: Dict[dt.date, Optional[str]] = {}
+        self._lock = threading.Lock()
+        if path:
+            self._stamps = self._decode(read_json(path, {}))
+
+    @staticmethod
+    def _decode(data: dict) -> Dict[dt.date, str]:
+        return {dt.date.fromisoformat(d): s for d, s in data.items()}
+
+    def get(self, day: dt.date) -> Optional[str]:
+        return self._stamps.get(day)
+
+    def remember(self, day: dt.date, stamp: str) -> None:
+        with self._lock:
+            if self._stamps.get(day) != stamp:
+                self._stamps[day] = stamp
+                self._changes[day] = stamp
+
+    def forget(self, day: dt.date) -> None:
+        with self._lock:
+            if self._stamps.pop(day, None) is not None:
+                self._changes[day] = None
+
+    def save(self) -> None:
+        """Накладывает свои изменения на файл (его могли сохранить другие загрузчики) и пишет результат."""
+        with self._lock:
+            if not self.path or not self._changes:
+                return
+            with locked(self.path):
+                stamps = self._decode(read_json(self.path, {}))
+                for day, stamp in self._changes.items():
+                    if stamp is None:
+                        stamps.pop(day, None)
+                    else:
+                        stamps[day] = stamp
+                write_json(self.path, {d.isoformat(): s for d, s in sorted(stamps.items())})
+            self._stamps = stamps
+            self._changes.clear()
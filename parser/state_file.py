@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: без межпроцессной блокировки; слияние при записи всё равно остаётся
+    fcntl = None
+
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """
+    Эксклюзивная блокировка path.lock на время «перечитать — слить — записать»:
+    файл состояния могут одновременно сохранять несколько загрузчиков.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield  # блокировка снимается при закрытии файла
+
+
+def read_json(path: str, default: Any) -> Any:
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path: str, data: Any) -> None:
+    """Атомарная запись: читатель видит либо старый файл, либо новый целиком."""
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path) or ".", suffix=".tmp", delete=False) as f:
+        json.dump(data, f, indent=0)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import pytest
+
+# модули загрузчика импортируются плоско (from downloader import ...), как при запуске из parser/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+class FixtureServer:
+    """
+    Локальный стенд биржи: отдаёт files[путь] (200) или 404, считает запросы
+    и наибольшее число одновременно обрабатываемых. statuses[путь] — очередь кодов,
+    которыми ответить на ближайшие запросы вместо обычного ответа (без тела).
+    head_allowed = False — на HEAD отвечать 405, как сервер, разрешающий только GET.
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.files: Dict[str, bytes] = {}
+        self.requests: List[str] = []
+        self.headers: List[Dict[str, str]] = []
+        self.statuses: Dict[str, List[int]] = {}
+        self.delay = delay
+        self.head_allowed = True
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего сервера
+
+            def _serve(self, body: bool) -> None:
+                with server._lock:
+                    server.requests.append(self.path)
+                    server.headers.append(dict(self.headers))
+                    forced = server.statuses.get(self.path)
+                    status = forced.pop(0) if forced else None
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.delay)
+                    if status is not None:
+                        self.send_response(status)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    payload = server.files.get(self.path)
+                    self.send_response(404 if payload is None else 200)
+                    self.send_header("Content-Length", str(len(payload or b"")))
+                    self.end_headers()
+                    if body and payload:
+                        self.wfile.write(payload)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def do_GET(self) -> None:
+                self._serve(body=True)
+
+            def do_HEAD(self) -> None:
+                if not server.head_allowed:
+                    with server._lock:
+                        server.requests.append(self.path)
+                        server.headers.append(dict(self.headers))
+                    self.send_response(405)
+                    self.send_header("Allow", "GET")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self._serve(body=False)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.httpd.server_port}/oil_xls_{{stamp}}.xls"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def publish(self, path: str, content: bytes) -> None:
+        self.files[path] = content
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fixture_server():
+    server = FixtureServer()
+    yield server
+    server.close()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import datetime as dt
+
+import pytest
+
+from bulletin_gen import make_bulletin
+from daemon import MSK, Daemon, PollSchedule
+from journal import IngestJournal
+
+
+
+DAY = dt.date(2024, 1, 9)
+PATH = "/oil_xls_20240109162000.xls"
+
+def at(hour: int, minute: int, second: int = 0) -> dt.datetime:
+    return dt.datetime.combine(DAY, dt.time(hour, minute, second), tzinfo=MSK)
+
+# ---------- PollSchedule.next_delay ----------
+
+SCHEDULE = PollSchedule()  # 16:20, опрос с 16:10, часто до 16:50, отказ в 23:30
+
+@pytest.mark.parametrize("now, slow_polls, expected", [
+    (at(15, 0), 0, 70 * 60),     # до начала опроса — ждём его
+    (at(16, 10), 0, 15.0),       # окно частого опроса
+    (at(16, 49, 59), 5, 15.0),   # slow_polls в частом окне не учитывается
+    (at(16, 50), 0, 15.0),       # после частого окна — удвоение от min_interval
+    (at(17, 0), 3, 120.0),
+    (at(18, 0), 10, 600.0),      # не больше max_interval
+    (at(23, 28), 10, 120.0),     # не дольше, чем до отказа
+    (at(23, 30), 0, None),       # на сегодня всё
+])
+def test_next_delay(now, slow_polls, expected):
+    assert SCHEDULE.next_delay(now, DAY, slow_polls) == expected
+
+# ---------- цикл опроса и загрузки ----------
+
+class FakeClock:
+    def __init__(self, now: dt.datetime, on_sleep=None) -> None:
+        self._now = now
+        self.sleeps = []
+        self.on_sleep = on_sleep  # вызывается после каждой паузы — «тем временем» на сервере
+
+    def now(self) -> dt.datetime:
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self._now += dt.timedelta(seconds=seconds)
+        if self.on_sleep is not None:
+            self.on_sleep()
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.commits = self.rollbacks = 0
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+class FakeLoader:
+    """Вместо БД: запоминает записанные дни; первые fail_flushes записей падают."""
+
+    def __init__(self, fail_flushes: int = 0) -> None:
+        self.session = FakeSession()
+        self.fail_flushes = fail_flushes
+        self.pending = []
+        self.written = []
+        self.parse_errors = []
+
+    def write(self, day, url, records) -> None:
+        self.pending.append((day, url, len(records)))
+
+    def flush(self) -> None:
+        if self.fail_flushes:
+            self.fail_flushes -= 1
+            raise ConnectionError("соединение с БД потеряно")
+        self.written += self.pending
+        self.pending = []
+
+    def discard(self) -> None:
+        self.pending = []
+        self.session.rollback()
+
+    def parse_failed(self, day, error, url=None) -> None:
+        self.parse_errors.append(day)
+
+
+class MemoryJournal(IngestJournal):
+    """Журнал без БД: в начале дня ничего не загружено."""
+
+    def load(self, session, start, end_exclusive) -> None:
+        pass
+
+def run_daemon(server, loader: FakeLoader) -> tuple[Daemon, FakeClock]:
+    server.publish(PATH, make_bulletin(DAY, rows_per_section=5, seed=1))
+    server.statuses[PATH] = [404, 404]  # файл появляется с третьего запроса
+    clock = FakeClock(at(16, 0))
+    daemon = Daemon(loader, MemoryJournal(), base=server.base, schedule=PollSchedule(), clock=clock)
+    daemon.run(max_days=1)
+    return daemon, clock
+
+def test_file_is_polled_until_published_and_loaded(fixture_server):
+    loader = FakeLoader()
+    _, clock = run_daemon(fixture_server, loader)
+
+    assert [(day, url.endswith(PATH)) for day, url, _ in loader.written] == [(DAY, True)]
+    assert loader.written[0][2] > 0
+    assert len(fixture_server.requests) == 3
+    # ждали начала опроса, дважды паузу частого опроса и потом — до следующего дня
+    assert clock.sleeps[:3] == [600.0, 15.0, 15.0]
+    assert clock.now() == dt.datetime.combine(DAY + dt.timedelta(days=1), dt.time(16, 10), tzinfo=MSK)
+
+def test_write_error_is_rolled_back_and_retried(fixture_server):
+    loader = FakeLoader(fail_flushes=1)
+    daemon, clock = run_daemon(fixture_server, loader)
+
+    assert loader.session.rollbacks == 1
+    assert [day for day, _, _ in loader.written] == [DAY]  # один раз, без остатков неудачной попытки
+    assert len(fixture_server.requests) == 4  # после паузы файл запрошен заново
+    assert clock.sleeps[:4] == [600.0, 15.0, 15.0, SCHEDULE.min_interval]
+    assert daemon._errors == 0
+
+def test_half_published_file_is_polled_again(fixture_server):
+    full = make_bulletin(DAY, rows_per_section=5, seed=1)
+    fixture_server.publish(PATH, full[: len(full) // 3])  # файл ещё докачивается на сервер
+    loader = FakeLoader()
+    clock = FakeClock(at(16, 0), on_sleep=lambda: fixture_server.publish(PATH, full) if loader.parse_errors else None)
+    daemon = Daemon(loader, MemoryJournal(), base=fixture_server.base, schedule=PollSchedule(), clock=clock)
+
+    daemon.run(max_days=1)
+
+    assert loader.parse_errors == [DAY]
+    assert [day for day, _, _ in loader.written] == [DAY]
+    assert len(fixture_server.requests) == 2
+    assert clock.sleeps[:2] == [600.0, SCHEDULE.min_interval]  # пауза после ошибки, а не до завтра
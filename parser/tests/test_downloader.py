@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import datetime as dt
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from bulletin_cache import BulletinCache
+from bulletin_gen import make_bulletin
+from downloader import DownloadError, daterange_days, discover_stamp, fetch_status, iter_daily_files, make_session
+
+
+
+START, END = dt.date(2024, 1, 1), dt.date(2024, 1, 22)
+
+@functools.lru_cache(maxsize=None)
+def bulletin(day: dt.date) -> bytes:
+    return make_bulletin(day, rows_per_section=5, seed=day.toordinal())
+
+def publish_weekdays(server, stamp: str = "162000") -> list[dt.date]:
+    """Файлы за будни периода, кроме 10-го числа (на него сервер ответит 404)."""
+    days = [d for d in daterange_days(START, END) if d.weekday() < 5 and d.day != 10]
+    for day in days:
+        server.publish(f"/oil_xls_{day:%Y%m%d}{stamp}.xls", bulletin(day))
+    return days
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_files_come_in_date_order_with_bounded_concurrency(fixture_server, workers):
+    fixture_server.delay = 0.05  # чтобы параллельные запросы успели пересечься
+    expected = publish_weekdays(fixture_server)
+
+    got = list(iter_daily_files(START, END, workers=workers, base=fixture_server.base, retries=0))
+
+    assert [day for day, _, _ in got] == expected
+    assert all(content == bulletin(day) for day, _, content in got)
+    assert all(url.endswith(f"{day:%Y%m%d}162000.xls") for day, url, _ in got)
+    # каждый день (и 404, и выходные без календаря) запрошен ровно один раз
+    assert len(fixture_server.requests) == len(list(daterange_days(START, END)))
+    assert fixture_server.max_in_flight <= workers
+    if workers > 1:
+        assert fixture_server.max_in_flight > 1
+
+def test_early_close_stops_downloads(fixture_server):
+    fixture_server.delay = 0.02
+    publish_weekdays(fixture_server)
+
+    files = iter_daily_files(START, END, workers=2, base=fixture_server.base, retries=0)
+    first = next(files)
+    files.close()
+
+    assert first[0] == START
+    # окно запросов ограничено: после закрытия генератора обход не продолжается
+    assert len(fixture_server.requests) <= 1 + 2 * 2
+
+def test_candidate_stamps_are_probed_and_remembered(fixture_server, tmp_path):
+    from stamps import StampRegistry
+
+    day = dt.date(2024, 1, 3)
+    fixture_server.publish(f"/oil_xls_{day:%Y%m%d}161500.xls", bulletin(day))
+    registry = StampRegistry(str(tmp_path / "stamps.json"))
+
+    got = list(iter_daily_files(
+        day, day + dt.timedelta(days=1), stamps=["162000", "161500"], registry=registry,
+        base=fixture_server.base, retries=0,
+    ))
+
+    assert [(d, url.rsplit("_", 1)[1]) for d, url, _ in got] == [(day, "20240103161500.xls")]
+    assert registry.get(day) == "161500"
+
+def test_304_without_cached_body_refetches_unconditionally(fixture_server):
+    url = fixture_server.base.format(stamp="20240109162000")
+    path = "/oil_xls_20240109162000.xls"
+    fixture_server.publish(path, bulletin(dt.date(2024, 1, 9)))
+    fixture_server.statuses[path] = [304]
+
+    assert fetch_status(url, retries=0) == (200, bulletin(dt.date(2024, 1, 9)))
+    assert len(fixture_server.requests) == 2
+    assert fixture_server.headers[1].get("Cache-Control") == "no-cache"
+    assert "If-None-Match" not in fixture_server.headers[1]
+
+def test_any_request_error_is_retried_then_reported(fixture_server):
+    url = fixture_server.base.format(stamp="20240109162000")
+    fixture_server.publish("/oil_xls_20240109162000.xls", b"xls")
+
+    class Flaky:
+        """Первый ответ обрывается посреди тела — не ConnectionError/Timeout."""
+
+        def __init__(self, failures: int) -> None:
+            self.failures = failures
+
+        def get(self, url, **kwargs):
+            if self.failures:
+                self.failures -= 1
+                raise requests.exceptions.ChunkedEncodingError("обрыв")
+            return requests.get(url, **kwargs)
+
+    assert fetch_status(url, session=Flaky(1), retries=1, sleep=lambda s: None) == (200, b"xls")
+    with pytest.raises(DownloadError, match="ChunkedEncodingError"):
+        fetch_status(url, session=Flaky(2), retries=1, sleep=lambda s: None)
+
+def test_cache_survives_concurrent_writers_in_one_process(tmp_path):
+    cache = BulletinCache(str(tmp_path))
+    url = "http://example.test/oil_xls_20240109162000.xls"
+    contents = [bulletin(dt.date(2024, 1, 9))[:1000] + bytes([i]) for i in range(16)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda c: cache.store(url, c), contents * 4))
+
+    assert cache.read(cache.lookup(url)) in contents
+    leftovers = [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith(".tmp")]
+    assert leftovers == []
+
+def probe(server, day: dt.date, stamps, retries: int = 1):
+    with ThreadPoolExecutor(max_workers=len(stamps)) as pool:
+        return discover_stamp(
+            day, stamps, make_session(len(stamps)), pool, base=server.base, retries=retries, sleep=lambda s: None,
+        )
+
+def test_stamp_probes_are_retried(fixture_server):
+    day = dt.date(2024, 1, 3)
+    path = f"/oil_xls_{day:%Y%m%d}161500.xls"
+    fixture_server.publish(path, bulletin(day))
+    fixture_server.statuses[path] = [503]
+
+    assert probe(fixture_server, day, ["162000", "161500"]) == (200, "161500")
+    assert fixture_server.requests.count(path) == 2
+
+    fixture_server.statuses[path] = [503, 429]
+    assert probe(fixture_server, day, ["161500"]) == (0, None)  # повторы кончились
+
+def test_stamp_probe_falls_back_to_ranged_get_on_405(fixture_server):
+    day = dt.date(2024, 1, 3)
+    fixture_server.publish(f"/oil_xls_{day:%Y%m%d}161500.xls", bulletin(day))
+    fixture_server.head_allowed = False
+
+    assert probe(fixture_server, day, ["162000", "161500"]) == (200, "161500")
+    assert probe(fixture_server, day, ["162000"]) == (404, None)
+    assert any(h.get("Range") == "bytes=0-0" for h in fixture_server.headers)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import datetime as dt
+from collections import Counter
+
+import loader
+from loader import UpsertStats, _dedup_last, _stats_from_returning
+
+
+
+D1, D2 = dt.date(2024, 1, 9), dt.date(2024, 1, 10)
+
+def test_duplicates_are_not_counted_as_unchanged():
+    offered = Counter({D1: 5, D2: 2})
+    returned = [(True, D1), (False, D1), (True, D2)]
+
+    stats = _stats_from_returning(returned, offered, Counter({D1: 2}))
+
+    assert (stats.inserted, stats.updated, stats.unchanged, stats.duplicates) == (2, 1, 2, 2)
+    assert stats.by_day[D1] == UpsertStats(inserted=1, updated=1, unchanged=1, duplicates=2)
+    assert stats.by_day[D2] == UpsertStats(inserted=1, unchanged=1)
+
+def test_dedup_keeps_last_record_per_product_and_day():
+    records = [
+        {"exchange_product_id": "A100ANK060F", "date": D1, "volume": 1},
+        {"exchange_product_id": "A100ANK060F", "date": D2, "volume": 2},
+        {"exchange_product_id": "A100ANK060F", "date": D1, "volume": 3},
+    ]
+
+    kept, duplicates = _dedup_last(records)
+
+    assert sorted((r["date"], r["volume"]) for r in kept) == [(D1, 3), (D2, 2)]
+    assert duplicates == Counter({D1: 1})
+
+class FakeSession:
+    def commit(self) -> None:
+        pass
+
+def test_copy_path_gets_parser_rows_as_is(monkeypatch):
+    rows = [("A100ANK060F", "Бензин", "ст. Ачинск", "A100", "ANK", "F", 60.0, 1000.0, 1, D1)]
+    passed = []
+
+    def fake_copy(session, got, names=None):
+        passed.append(got)
+        return UpsertStats(inserted=1, by_day={D1: UpsertStats(inserted=1)})
+
+    monkeypatch.setattr(loader, "copy_upsert_results", fake_copy)
+    monkeypatch.setattr(loader.queries, "invalidate", lambda: None)
+    writer = loader.Loader(FakeSession(), method="copy", aggregates=False, notify=False)
+    writer.write(D1, "http://example/1.xls", rows)
+
+    assert passed == [rows] and passed[0][0] is rows[0]  # без пересборки строк
+    assert writer.total_rows == 1
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import datetime as dt
+import math
+
+import pytest
+
+from bulletin_gen import UNITS, make_bulletin
+from parser import READERS, TON_MARKER, to_records
+
+
+
+def normalized(records):
+    # NaN != NaN — для сравнения заменяем на метку
+    return [
+        {k: "<NaN>" if isinstance(v, float) and math.isnan(v) else v for k, v in r.items()}
+        for r in records
+    ]
+
+CASES = [
+    # (дата, строк в секции, листов, секции, seed)
+    (dt.date(2024, 1, 9), 40, 1, UNITS, 0),
+    (dt.date(2024, 2, 1), 25, 2, UNITS, 1),
+    (dt.date(2024, 3, 5), 10, 3, UNITS[::-1], 2),       # тонны — последней секцией
+    (dt.date(2024, 4, 2), 30, 1, [TON_MARKER], 3),      # только нужная секция
+    (dt.date(2024, 5, 6), 15, 2, [TON_MARKER, TON_MARKER], 4),  # две секции тонн на листе
+]
+
+@pytest.mark.parametrize("day,rows,sheets,units,seed", CASES)
+def test_xlrd_reader_matches_pandas_reader(day, rows, sheets, units, seed):
+    content = make_bulletin(day, rows_per_section=rows, sheets=sheets, units=units, seed=seed)
+
+    expected = to_records(READERS["pandas"](content, fallback_date=day))
+    got = to_records(READERS["xlrd"](content, fallback_date=day))
+
+    assert normalized(got) == normalized(expected)
+    assert {r["date"] for r in got} == {day}
+
+@pytest.mark.parametrize("reader", sorted(READERS))
+def test_dash_and_total_rows(reader):
+    day = dt.date(2024, 1, 9)
+    content = make_bulletin(day, rows_per_section=40, units=[TON_MARKER], seed=7)
+
+    records = to_records(READERS[reader](content, fallback_date=day))
+
+    # инструменты без сделок (count = "-") отброшены
+    products = [r for r in records if r["exchange_product_id"] != "Итого:"]
+    assert products and all(r["count"] > 0 for r in products)
+    assert all(not math.isnan(r["volume"]) and not math.isnan(r["total"]) for r in products)
+    # строка «Итого» (count > 0) проходит с пустыми названиями и NaN в суммах — как в исходном разборе
+    totals = [r for r in records if r["exchange_product_id"] == "Итого:"]
+    assert len(totals) == 1
+    assert totals[0]["count"] == 40
+    assert math.isnan(totals[0]["volume"]) and math.isnan(totals[0]["total"])
+    assert isinstance(totals[0]["exchange_product_name"], float) and math.isnan(totals[0]["exchange_product_name"])
+
+def test_bulletin_without_ton_section_is_an_error():
+    content = make_bulletin(dt.date(2024, 1, 9), rows_per_section=5, units=UNITS[1:])
+    for parse in READERS.values():
+        with pytest.raises(ValueError):
+            parse(content)
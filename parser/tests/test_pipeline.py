@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import datetime as dt
+
+import pipeline
+from bulletin_gen import make_bulletin
+from parser import READERS, RECORD_FIELDS, to_rows
+
+
+
+def test_archive_failure_does_not_fail_the_day(monkeypatch, capsys):
+    day = dt.date(2024, 1, 9)
+    content = make_bulletin(day, rows_per_section=10, seed=1)
+
+    def broken_write_day(root, day, df):
+        raise OSError("диск переполнен")
+
+    monkeypatch.setattr(pipeline, "write_day", broken_write_day)
+    rows = pipeline.parse_day(day, content, archive="/nonexistent")
+
+    expected = to_rows(READERS["pandas"](content, fallback_date=day))
+    pid = RECORD_FIELDS.index("exchange_product_id")
+    assert [r[pid] for r in rows] == [r[pid] for r in expected]
+    assert "диск переполнен" in capsys.readouterr().out
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import datetime as dt
+
+import queries
+from query_cache import TTLCache
+
+
+
+def test_positional_keyword_and_default_calls_share_cache_entry(monkeypatch):
+    calls = []
+
+    @queries._cached
+    def lookup(oil_id=None, start=None, **filters):
+        calls.append((oil_id, start, filters))
+        return len(calls)
+
+    monkeypatch.setattr(queries, "_cache", TTLCache())
+    day = dt.date(2024, 1, 9)
+
+    assert lookup("A592", day, delivery_type_id="F") == 1
+    assert lookup(oil_id="A592", start=day, delivery_type_id="F") == 1
+    assert lookup(start=day, delivery_type_id="F", oil_id="A592") == 1
+    assert lookup("A592") == 2
+    assert lookup("A592", None) == 2
+    assert lookup() == 3
+    assert lookup(None) == 3
+
+    queries.invalidate()
+    assert lookup() == 4
+
+def test_callers_get_their_own_copy_of_cached_rows(monkeypatch):
+    @queries._cached
+    def rows(oil_id=None):
+        return [{"oil_id": oil_id, "volume": 10}]
+
+    monkeypatch.setattr(queries, "_cache", TTLCache())
+
+    first = rows("A592")
+    first[0]["volume"] = 0
+    first.append({"oil_id": "лишняя"})
+    second = rows("A592")
+    second.clear()
+
+    assert rows("A592") == [{"oil_id": "A592", "volume": 10}]
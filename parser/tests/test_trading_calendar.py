@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+
+from downloader import BASE, state_path
+from stamps import StampRegistry
+from trading_calendar import TradingCalendar
+
+
+
+TODAY = dt.date(2024, 3, 1)
+DAY = dt.date(2024, 1, 9)  # вторник
+
+def test_missing_day_is_reprobed_with_new_stamps(tmp_path):
+    path = str(tmp_path / "calendar.json")
+    calendar = TradingCalendar(path)
+    calendar.mark_missing(DAY, stamps=["162000"], today=TODAY)
+    calendar.save()
+
+    calendar = TradingCalendar(path)
+    assert not calendar.should_probe(DAY, ["162000"])
+    assert calendar.should_probe(DAY, ["162000", "161500"])
+
+    calendar.mark_missing(DAY, stamps=["162000", "161500"], today=TODAY)
+    assert not calendar.should_probe(DAY, ["161500"])
+    calendar.mark_trading(DAY)
+    assert calendar.should_probe(DAY, ["162000"])
+
+def test_recent_days_are_not_remembered_as_missing():
+    calendar = TradingCalendar()
+    calendar.mark_missing(TODAY - dt.timedelta(days=1), stamps=["162000"], today=TODAY)
+    assert calendar.should_probe(TODAY - dt.timedelta(days=1), ["162000"])
+
+def test_legacy_format_is_read_as_default_stamp(tmp_path):
+    path = tmp_path / "calendar.json"
+    path.write_text(json.dumps({"trading": [], "non_trading": [DAY.isoformat()]}))
+
+    calendar = TradingCalendar(str(path))
+
+    assert not calendar.should_probe(DAY, ["162000"])
+    assert calendar.should_probe(DAY, ["161500"])
+
+def test_state_is_kept_per_source():
+    assert state_path("calendar.json") != state_path("calendar.json", "http://127.0.0.1:8765/{stamp}.xls")
+    assert state_path("calendar.json", BASE).endswith("calendar.json")
+
+def test_concurrent_saves_are_merged(tmp_path):
+    path = str(tmp_path / "calendar.json")
+    first, second = TradingCalendar(path), TradingCalendar(path)
+    first.mark_trading(DAY)
+    first.mark_missing(dt.date(2024, 1, 10), stamps=["162000"], today=TODAY)
+    second.mark_missing(dt.date(2024, 1, 10), stamps=["161500"], today=TODAY)
+    second.mark_missing(DAY, stamps=["162000"], today=TODAY)  # уже торговый у first
+    first.save()
+    second.save()
+
+    calendar = TradingCalendar(path)
+    assert calendar.trading == {DAY}
+    assert calendar.non_trading == {dt.date(2024, 1, 10): frozenset({"162000", "161500"})}
+
+def test_stamp_registry_applies_own_changes_over_file(tmp_path):
+    path = str(tmp_path / "stamps.json")
+    seed = StampRegistry(path)
+    seed.remember(DAY, "162000")
+    seed.save()
+
+    first, second = StampRegistry(path), StampRegistry(path)
+    first.remember(dt.date(2024, 1, 10), "161500")
+    second.forget(DAY)
+    first.save()
+    second.save()
+
+    registry = StampRegistry(path)
+    assert registry.get(DAY) is None
+    assert registry.get(dt.date(2024, 1, 10)) == "161500"
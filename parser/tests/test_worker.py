@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from journal import IngestJournal
+from worker import day_outcome
+
+
+
+TODAY = dt.date(2024, 3, 1)
+
+def test_only_errors_and_fresh_missing_days_are_retried():
+    journal = IngestJournal(settle_days=3)
+    journal.entries = {
+        dt.date(2024, 2, 1): ("done", "sha"),
+        dt.date(2024, 2, 2): ("failed", None),
+        dt.date(2024, 2, 3): ("missing", None),
+        dt.date(2024, 2, 28): ("missing", None),
+    }
+
+    assert day_outcome(journal, dt.date(2024, 2, 1), TODAY) == "done"
+    assert day_outcome(journal, dt.date(2024, 2, 2), TODAY) == "retry"
+    assert day_outcome(journal, dt.date(2024, 2, 3), TODAY) == "done"
+    assert day_outcome(journal, dt.date(2024, 2, 28), TODAY) == "retry"
+    assert day_outcome(journal, dt.date(2024, 2, 29), TODAY) == "retry"  # не обработан
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from state_file import locked, read_json, write_json
+
+
+
+# Под каким stamp-ом искались дни, записанные старым форматом (списком дат без stamp-ов)
+LEGACY_STAMPS = frozenset({"162000"})
+
+
+class TradingCalendar:
+    """
+    Какие дни стоит запрашивать у биржи.
+
+    По умолчанию пропускаем субботу и воскресенье; дни, на которые сервер
+    ответил 404 по всем кандидатам stamp-а, запоминаем как неторговые вместе с
+    этими stamp-ами. Повторно такой день не спрашиваем, пока набор кандидатов
+    не расширится: день, пропущенный из-за неверного stamp-а, найдётся с новым.
+    Дни, где файл нашёлся (в т.ч. рабочие субботы), запоминаем как торговые.
+    Состояние хранится в JSON-файле path; при сохранении сливается с тем, что
+    успели записать другие процессы.
+    """
+
+    def __init__(self, path: Optional[str] = None, skip_weekends: bool = True, settle_days: int = 3) -> None:
+        self.path = path
+        self.skip_weekends = skip_weekends
+        # 404 за последние settle_days дней не запоминаем: файл ещё может появиться
+        self.settle_days = settle_days
+        self.trading: Set[dt.date] = set()
+        # день -> stamp-ы, по которым получен 404
+        self.non_trading: Dict[dt.date, FrozenSet[str]] = {}
+        self._dirty = False
+        if path:
+            self.trading, self.non_trading = self._decode(read_json(path, {}))
+
+    @staticmethod
+    def _decode(data: dict) -> Tuple[Set[dt.date], Dict[dt.date, FrozenSet[str]]]:
+        trading = {dt.date.fromisoformat(d) for d in data.get("trading", [])}
+        non_trading = data.get("non_trading", {})
+        if isinstance(non_trading, list):  # старый формат
+            non_trading = {d: sorted(LEGACY_STAMPS) for d in non_trading}
+        return trading, {dt.date.fromisoformat(d): frozenset(s) for d, s in non_trading.items()}
+
+    def should_probe(self, day: dt.date, stamps: Iterable[str] = LEGACY_STAMPS) -> bool:
+        """stamps — кандидаты, которые будут запрошены; день с 404 по всем им не спрашиваем."""
+        if day in self.trading:
+            return True
+        tried = self.non_trading.get(day)
+        if tried is not None and set(stamps) <= tried:
+            return False
+        if self.skip_weekends and day.weekday() >= 5:
+            return False
+        return True
+
+    def mark_trading(self, day: dt.date) -> None:
+        if day not in self.trading:
+            self.trading.add(day)
+            self.non_trading.pop(day, None)
+            self._dirty = True
+
+    def mark_missing(self, day: dt.date, stamps: Iterable[str] = LEGACY_STAMPS, today: Optional[dt.date] = None) -> None:
+        """404 по всем stamps (вызывающий обязан перебрать их все)."""
+        today = today or dt.date.today()
+        if (today - day).days <= self.settle_days or day in self.trading:
+            return
+        tried = self.non_trading.get(day, frozenset()) | frozenset(stamps)
+        if tried != self.non_trading.get(day):
+            self.non_trading[day] = tried
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Сливает своё состояние с файлом (его могли сохранить другие загрузчики) и пишет
+        объединение: торговые дни и опробованные stamp-ы только добавляются.
+        """
+        if not self.path or not self._dirty:
+            return
+        with locked(self.path):
+            trading, non_trading = self._decode(read_json(self.path, {}))
+            trading |= self.trading
+            for day, stamps in self.non_trading.items():
+                non_trading[day] = non_trading.get(day, frozenset()) | stamps
+            self.trading = trading
+            self.non_trading = {d: s for d, s in non_trading.items() if d not in trading}
+            write_json(self.path, {
+                "trading":     sorted(d.isoformat() for d in self.trading),
+                "non_trading": {d.isoformat(): sorted(s) for d, s in sorted(self.non_trading.items())},
+            })
+        self._dirty = False
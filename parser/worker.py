@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import functools
+import hashlib
+import os
+import socket
+from contextlib import closing
+from typing import Callable, Iterator, List, Optional, Set
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+
+from bulletin_cache import BulletinCache
+from cli import loader_arguments, parse_loader_arguments
+from database import SessionLocal, engine
+from downloader import DownloadError, daterange_days, iter_daily_files, state_path
+from journal import IngestJournal
+from loader import Loader, init_db
+from models import SpimexIngestQueue
+from pipeline import parse_day
+from stamps import StampRegistry
+from trading_calendar import TradingCalendar
+
+
+
+# Очереди прошлых прогонов старше стольких дней удаляются при старте воркера
+QUEUE_KEEP_DAYS = 7
+
+def default_run_id(args, since: dt.date, until: dt.date, stamps: List[str]) -> str:
+    """Воркеры, запущенные в один день с одинаковыми опциями, сами попадают в одну очередь."""
+    key = "|".join(map(str, (since, until, ",".join(stamps), args.base_url, args.force, args.recheck, dt.date.today())))
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+def seed_queue(conn: Connection, run_id: str, days: List[dt.date]) -> None:
+    """
+    Ставит дни в очередь прогона. Уже обработанные другими воркерами остаются done,
+    отложенные (retry) возвращаются в pending — их повторит этот запуск.
+    """
+    Q = SpimexIngestQueue
+    conn.execute(delete(Q).where(
+        Q.run_id != run_id, Q.created_on < func.now() - dt.timedelta(days=QUEUE_KEEP_DAYS),
+    ))
+    if not days:
+        return
+    stmt = insert(Q).values([{"run_id": run_id, "date": day, "status": "pending"} for day in sorted(days)])
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=["run_id", "date"],
+        set_={"status": "pending", "owner": None, "finished_on": None},
+        where=Q.status == "retry",
+    ))
+
+def claim_chunks(
+    conn: Connection,
+    run_id: str,
+    chunk_days: int,
+    owner: str,
+    outcome: Callable[[dt.date], str],
+) -> Iterator[List[dt.date]]:
+    """
+    Берём из очереди прогона до chunk_days дней в статусе pending. SELECT ... FOR UPDATE
+    SKIP LOCKED держит их строки, пока пачка загружается, — другие воркеры их пропускают.
+    После пачки дни получают статус outcome(day) (done или retry) и транзакция фиксируется:
+    обработанный день в этом прогоне больше не возьмёт никто, в том числе при --force/--recheck.
+    Если воркер упал или пачка прервалась исключением, транзакция откатывается и дни снова pending.
+    """
+    Q = SpimexIngestQueue
+    while True:
+        with conn.begin():
+            claimed = list(conn.scalars(
+                select(Q.date)
+                .where(Q.run_id == run_id, Q.status == "pending")
+                .order_by(Q.date)
+                .limit(chunk_days)
+                .with_for_update(skip_locked=True)
+            ))
+            if not claimed:
+                return
+            yield claimed
+            for day in claimed:
+                conn.execute(
+                    update(Q).where(Q.run_id == run_id, Q.date == day)
+                    .values(status=outcome(day), owner=owner, finished_on=func.now())
+                )
+
+def day_outcome(journal: IngestJournal, day: dt.date, today: Optional[dt.date] = None) -> str:
+    """Статус дня в очереди по журналу: retry — ошибка или свежий день, файла которого пока нет."""
+    entry = journal.entries.get(day)
+    if entry is None or entry[0] == "failed":
+        return "retry"
+    if entry[0] == "missing" and ((today or dt.date.today()) - day).days <= journal.settle_days:
+        return "retry"
+    return "done"
+
+def load_chunk(chunk: List[dt.date], loader: Loader, journal: IngestJournal, args, **fetch_kwargs) -> None:
+    """Загрузка захваченных дней; дни без файла отмечаются в журнале как missing."""
+    start, end = chunk[0], chunk[-1] + dt.timedelta(days=1)
+    # журнал перечитываем уже после захвата: день мог загрузить другой воркер (прошлый прогон)
+    with SessionLocal() as session:
+        journal.load(session, start, end)
+    skip = journal.settled_done()
+    todo = [d for d in chunk if d not in skip]
+    if not todo:
+        return
+
+    seen: Set[dt.date] = set()
+
+    def failed(day: dt.date, error: DownloadError) -> None:
+        seen.add(day)
+        journal.failed(day, error)
+
+    wanted = set(todo)
+    files = journal.filter(iter_daily_files(
+        start, end,
+        exclude=[d for d in daterange_days(start, end) if d not in wanted],
+        on_failure=failed, **fetch_kwargs,
+    ))
+    with closing(files):
+        for day, url, content in files:
+            seen.add(day)
+            try:
+                rows = parse_day(day, content, reader=args.reader)
+            except Exception as e:
+                loader.parse_failed(day, e, url)
+                continue
+            loader.write(day, url, rows)
+    loader.flush()
+
+    # что не скачалось и не упало — файла нет (или не изменился: такие дни уже done)
+    missing = [d for d in todo if d not in seen and not journal.is_done(d)]
+    if missing:
+        for day in missing:
+            journal.mark_missing(loader.session, day)
+        loader.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="SPIMEX: воркер загрузки, делящий период с другими воркерами через БД",
+        parents=[loader_arguments(workers=2)],
+    )
+    parser.add_argument("--chunk-days", type=int, default=5, help="Сколько дней захватывать за раз (по умолчанию 5)")
+    parser.add_argument("--run-id", help="Имя общей очереди прогона (по умолчанию — из периода, --time, --base-url, --force/--recheck и текущей даты)")
+    args = parser.parse_args()
+
+    since, until, stamps = parse_loader_arguments(args)
+    if args.chunk_days < 1:
+        raise SystemExit("chunk-days должно быть >= 1")
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    run_id = args.run_id or default_run_id(args, since, until, stamps)
+    init_db(since, until)
+
+    journal = IngestJournal(recheck=args.recheck, force=args.force)
+    with SessionLocal() as session:
+        journal.load(session, since, until)
+    calendar = TradingCalendar(state_path("calendar.json", args.base_url), skip_weekends=not args.all_days)
+    skip = journal.settled_done()
+    days = [d for d in daterange_days(since, until) if d not in skip and calendar.should_probe(d, stamps)]
+    print(f"[{worker_id}] Прогон {run_id}, к загрузке дней: {len(days)}")
+
+    fetch_kwargs = dict(
+        time_str=stamps[0], stamps=stamps, workers=args.workers, base=args.base_url,
+        cache=None if args.no_cache else BulletinCache(args.cache_dir),
+        calendar=calendar, registry=StampRegistry(state_path("stamps.json", args.base_url)),
+        retries=args.retries,
+    )
+    chunks = 0
+    with engine.connect() as queue_conn, SessionLocal() as session:
+        with queue_conn.begin():
+            seed_queue(queue_conn, run_id, days)
+        loader = Loader(
+            session, method=args.method, batch_days=args.batch_days,
+            aggregates=not args.no_aggregates, journal=journal, notify=not args.no_notify,
+        )
+        outcome = functools.partial(day_outcome, journal)
+        for chunk in claim_chunks(queue_conn, run_id, args.chunk_days, worker_id, outcome):
+            chunks += 1
+            print(f"[{worker_id}] Захвачено: {chunk[0]}..{chunk[-1]} ({len(chunk)} дн.)")
+            load_chunk(chunk, loader, journal, args, **fetch_kwargs)
+
+    print(f"[{worker_id}] Пачек: {chunks}. {loader.summary()}")
+
+if __name__ == "__main__":
+    main()